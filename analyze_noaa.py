@@ -7,12 +7,27 @@
 #                                                                    #
 ######################################################################
 
+import csv
+import json
+import math
+import os.path
+import sys
+
 import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import mlpy
+
+import classifiers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'kmlutils'))
+from options import parse_options
 
 SAMPLE_SIZE = 5000
+# The storms written by refine_noaa.py. If there is an up to date .npy version
+# of the file next to it, that is read instead.
+DATA_FILE = 'data/StormEvents_combined_d2010.csv'
+# The fields of the storms, in the same order as the columns of the text file.
+STORM_DTYPE = np.dtype([('event_id', '<i8'), ('latitude', '<f8'),
+            ('longitude', '<f8'), ('event_type', '<i4')])
 MYCOLORS = ['DarkOrange','OliveDrab','Orchid','Orange','Peru','Turquoise',
             'LightBlue','DarkSeaGreen','Purple','Khaki','DarkSlateBlue',
             'LimeGreen','Pink','FireBrick','MidnightBlue','WhiteSmoke']
@@ -28,25 +43,58 @@ EVENT_TYPES = ['ASTRONOMICAL LOW TIDE', 'AVALANCHE', 'BLIZZARD',
             'STORM SURGE/TIDE', 'STRONG WIND', 'THUNDERSTORM WIND', 'TORNADO',
             'TROPICAL DEPRESSION', 'TROPICAL STORM', 'TSUNAMI', 'VOLCANIC ASH',
             'WATERSPOUT', 'WILDFIRE', 'WINTER STORM', 'WINTER WEATHER']
+# The columns of a CSV report, one line for each storm type.
+REPORT_FIELDS = ['event_type', 'number', 'count', 'correct', 'accuracy',
+            'true_positives', 'true_negatives', 'false_positives',
+            'false_negatives', 'chi_squared', 'p_value', 'useful']
 
 def main():
+    # The --report option skips the plots and writes the results to a file
+    # instead, as JSON, or as CSV if the file name ends in .csv.
+    try:
+        options, file_args = parse_options(sys.argv[1:], {'--report': None},
+                {'-r': '--report'})
+    except ValueError:
+        print_usage()
+    if len(file_args) > 1:
+        print_usage()
+    data_file = file_args[0] if file_args else DATA_FILE
+    report_file = options['--report']
+
     # Load the data.
-    data = np.loadtxt('data/StormEvents_combined_d2010.csv', delimiter='\t')
-    locations = np.hstack((data[:, 2:3], data[:, 1:2]))
-    categories = np.array(data[:, 3], dtype=np.int)
+    storms = load_storms(data_file)
 
-    # Take a random sample and perform an LDA analysis.
+    # Take a random sample and perform an LDA analysis. Only the storms in the
+    # sample are read from the file.
     np.random.seed(0)
-    sample_choice = np.random.choice(range(len(data)), size=SAMPLE_SIZE)
-    sample_loc = np.zeros((SAMPLE_SIZE, 2))
-    sample_cat = np.zeros(SAMPLE_SIZE, np.int)
-    sample_cat_counts = np.zeros(len(EVENT_TYPES), np.int)
+    sample_choice = np.random.choice(len(storms), size=SAMPLE_SIZE)
+    sample = storms[sample_choice]
+    sample_loc = np.column_stack((sample['longitude'], sample['latitude']))
+    sample_cat = sample['event_type'].astype(int)
+    # Storms of an unknown type are -1 and aren't counted.
+    sample_cat_counts = np.bincount(sample_cat[sample_cat >= 0],
+            minlength=len(EVENT_TYPES))
+
+    # Classify the data
+    classifications, model = ldac(sample_loc, sample_cat)
 
-    for i, choice in enumerate(sample_choice):
-        sample_loc[i][0] = locations[choice][0]
-        sample_loc[i][1] = locations[choice][1]
-        sample_cat[i] = categories[choice]
-        sample_cat_counts[categories[choice]] += 1
+    # Check the classification against the actual storm types.
+    correct = classifications == sample_cat
+    correct_total = np.count_nonzero(correct)
+    # The evaluations array contains the total number of True Positives (0),
+    # True Negatives (1), False Positives (2), and False Negatives (3) for each
+    # event type:
+    evaluations = confusion_evaluations(sample_cat, classifications,
+            len(EVENT_TYPES))
+
+    if report_file is not None:
+        write_report(report_file, data_file, correct_total,
+                type_results(sample_cat_counts, evaluations))
+        return
+
+    # Matplotlib takes a long time to import, so it is only imported when the
+    # results are plotted.
+    import matplotlib.pyplot as plt
 
     # Plot the sample data.
     ax1 = plt.subplot2grid((4,2), (0,0),
@@ -54,46 +102,12 @@ def main():
     colormap = [MYCOLORS[x%len(MYCOLORS)] for x in sample_cat]
     ax1.scatter(sample_loc[:, 0:1], sample_loc[:, 1:2], c=colormap)
 
-    # Classify the data
-    classifications = ldac(sample_loc, sample_cat)
+    # Plot the classifications.
+    plot_ldac(plt, sample_loc, classifications, model)
 
-    # Check the classification against the actual storm types.
-    correct_total = 0
     # The locations of the correctly and incorrectly classified storms:
-    correct_loc = []
-    incorrect_loc = []
-    # The evaluations array contains the total number of True Positives (0),
-    # True Negatives (1), False Positives (2), and False Negatives (3) for each
-    # event type:
-    evaluations = np.zeros((len(EVENT_TYPES), 4), np.int)
-    for i, classification in enumerate(classifications):
-        if classification == sample_cat[i]:
-            correct_total += 1
-            correct_loc.append(sample_loc[i])
-        else:
-            incorrect_loc.append(sample_loc[i])
-
-        # Positive
-        for event_type_index, event_type in enumerate(EVENT_TYPES):
-            if classification == event_type_index:
-                # True
-                if sample_cat[i] == event_type_index:
-                    evaluations[event_type_index][0] += 1
-                # False
-                else:
-                    evaluations[event_type_index][2] += 1
-            # Negative
-            else:
-                # True
-                if sample_cat[i] != event_type_index:
-                    evaluations[event_type_index][1] += 1
-                # False
-                else:
-                    evaluations[event_type_index][3] += 1
-
-    correct_loc = np.array(correct_loc)
-    incorrect_loc = np.array(incorrect_loc)
-    evaluations = np.array(evaluations)
+    correct_loc = sample_loc[correct]
+    incorrect_loc = sample_loc[~correct]
 
     # Plot the correctness data.
     ax2 = plt.subplot2grid((4,2), (0,1),
@@ -138,28 +152,106 @@ def main():
     print('Storm types not listed were not present in the sample.')
     plt.show()
 
-# Use mlpy's Linear Discriminant Analysis to learn and classify the data.
-def ldac(locations, categories):
-    ax = plt.subplot2grid((4,2), (1,0), colspan=2, rowspan=2,
-            title='Classification Lines', xlim=[-180,-40], ylim=[10,70])
+# The results for each event type that is in the sample, as a list of
+# dictionaries with the columns in REPORT_FIELDS.
+def type_results(sample_cat_counts, evaluations):
+    results = []
+    for i, event_type in enumerate(EVENT_TYPES):
+        if sample_cat_counts[i] == 0:
+            continue
+        true_positives, true_negatives, false_positives, false_negatives = (
+                int(count) for count in evaluations[i])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chisquared, pvalue, significance = chisq_test(*evaluations[i])
+        results.append({
+            'event_type': event_type,
+            'number': i + 1,
+            'count': int(sample_cat_counts[i]),
+            'correct': true_positives,
+            'accuracy': true_positives / int(sample_cat_counts[i]),
+            'true_positives': true_positives,
+            'true_negatives': true_negatives,
+            'false_positives': false_positives,
+            'false_negatives': false_negatives,
+            # The test can't be done if a storm type was never predicted, so
+            # those are left empty.
+            'chi_squared': finite_or_none(chisquared),
+            'p_value': finite_or_none(pvalue),
+            'useful': bool(significance)})
+    return results
+
+# Write the results of a run to a report file, or to stdout if the file is
+# '-'. A CSV report has a line for each event type. A JSON report also has the
+# totals for the whole sample.
+def write_report(report_file, data_file, correct_total, results):
+    if report_file == '-':
+        write_json_report(sys.stdout, data_file, correct_total, results)
+        return
+    if report_file.lower().endswith('.csv'):
+        with open(report_file, 'w', newline='') as report:
+            writer = csv.DictWriter(report, REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        return
+    with open(report_file, 'w') as report:
+        write_json_report(report, data_file, correct_total, results)
+
+def write_json_report(report, data_file, correct_total, results):
+    json.dump({'data_file': data_file,
+               'sample_size': SAMPLE_SIZE,
+               'correct': int(correct_total),
+               'accuracy': int(correct_total) / SAMPLE_SIZE,
+               'event_types': results}, report, indent=2)
+    report.write('\n')
 
-    ldac = mlpy.LDAC()
+# NaN and infinity aren't allowed in JSON.
+def finite_or_none(value):
+    value = float(value)
+    if math.isfinite(value):
+        return value
+    return None
+
+def print_usage():
+    print((
+            'Usage: {} [--report=FILE] [DATA_FILE]\n'
+            'DATA_FILE is a file written by refine_noaa.py (default: {}).\n'
+            'With --report, the plots are skipped and the results for each '
+            'storm type are\nwritten to FILE as JSON, or as CSV if it ends '
+            'in .csv. FILE can be - for stdout.'
+            ).format(sys.argv[0], DATA_FILE), file=sys.stderr)
+    exit()
+
+# Load the storms from a file written by refine_noaa.py as an array of
+# STORM_DTYPE. A .npy file is memory mapped rather than read, so it doesn't
+# have to fit in memory.
+def load_storms(data_file):
+    array_file = os.path.splitext(data_file)[0] + '.npy'
+    if (os.path.exists(array_file) and (not os.path.exists(data_file) or
+            os.path.getmtime(array_file) >= os.path.getmtime(data_file))):
+        data_file = array_file
+    if data_file.endswith('.npy'):
+        return np.load(data_file, mmap_mode='r')
+    return np.loadtxt(data_file, dtype=STORM_DTYPE, delimiter='\t', ndmin=1)
+
+# Use Linear Discriminant Analysis to learn and classify the data. Returns the
+# classifications and the classifier.
+def ldac(locations, categories):
+    ldac = classifiers.LDAC()
     ldac.learn(locations, categories)
 
-    classifications = np.zeros(SAMPLE_SIZE, np.int)
-    for i, storm in enumerate(locations):
-        classifications[i] = ldac.pred(storm)
+    classifications = np.asarray(ldac.pred(locations), dtype=int)
+
+    return classifications, ldac
+
+# Plot the classifications of ldac and the lines between the classes.
+def plot_ldac(plt, locations, classifications, ldac):
+    ax = plt.subplot2grid((4,2), (1,0), colspan=2, rowspan=2,
+            title='Classification Lines', xlim=[-180,-40], ylim=[10,70])
 
     # Plot the predictions.
     ## Map the categories to colors
-    for event_type_index in range(len(EVENT_TYPES)):
-        this_predicted_category = []
-        for i in range(SAMPLE_SIZE):
-            if classifications[i] == event_type_index:
-                this_predicted_category.append(locations[i])
-        if not this_predicted_category:
-            continue
-        this_predicted_category = np.array(this_predicted_category)
+    for event_type_index in np.unique(classifications[classifications >= 0]):
+        this_predicted_category = locations[classifications == event_type_index]
         ax.scatter(this_predicted_category[:, 0], this_predicted_category[:, 1],
                 label=EVENT_TYPES[event_type_index],
                 c=MYCOLORS[event_type_index%len(MYCOLORS)])
@@ -176,19 +268,35 @@ def ldac(locations, categories):
             y = (x* (w[j][0] - w[i][0]) + b[j] - b[i]) / (w[i][1] - w[j][1])
             ax.plot(x,y,'k--')
 
-    return classifications
-
-# Use mlpy's k-Nearest Neighbor to learn and classify the data.
+# Use k-Nearest Neighbor to learn and classify the data, by the distance
+# between the storms along the surface of the Earth.
 def knn(locations, categories):
-    knn = mlpy.KNN(k=3)
+    knn = classifiers.KNN(k=3, metric='haversine')
     knn.learn(locations, categories)
 
-    classifications = np.zeros(SAMPLE_SIZE, np.int)
-    for i, storm in enumerate(locations):
-        classifications[i] = knn.pred(storm)
+    classifications = np.asarray(knn.pred(locations), dtype=int)
 
     return classifications
 
+# Count the True Positives, True Negatives, False Positives and False Negatives
+# for each of the class_count classes, given the actual and predicted class of
+# each sample. Returns a (class_count, 4) array in that order. The counts come
+# from a confusion matrix whose rows are the actual classes and whose columns
+# are the predicted classes. Samples of class -1 are never a positive of any
+# class, so they get an extra row and column that is left out of the totals.
+def confusion_evaluations(actual, predicted, class_count):
+    size = class_count + 1
+    confusion = np.bincount(np.where(actual < 0, class_count, actual) * size +
+            np.where(predicted < 0, class_count, predicted),
+            minlength=size * size).reshape(size, size)
+    true_positives = np.diag(confusion)[:class_count]
+    false_positives = confusion.sum(axis=0)[:class_count] - true_positives
+    false_negatives = confusion.sum(axis=1)[:class_count] - true_positives
+    true_negatives = (len(actual) - true_positives - false_positives -
+            false_negatives)
+    return np.column_stack((true_positives, true_negatives, false_positives,
+        false_negatives))
+
 # This is a chi-squared test to see if the classification of our machine
 # learning algorithm was useful.
 # Contingency table:
@@ -218,8 +326,10 @@ def chisq_test(true_positives, true_negatives, false_positives, false_negatives)
             + (false_negatives - expected_false_negatives)**2 / expected_false_negatives
             + (true_negatives - expected_true_negatives)**2 / expected_true_negatives )
 
-    # Get the p-value.
-    pvalue = stats.chi2.sf(chisquared, df=1)
+    # Get the p-value. With one degree of freedom, the chi-squared
+    # distribution is the square of a normal distribution, so this is the same
+    # as scipy.stats.chi2.sf(chisquared, df=1) without having to import scipy.
+    pvalue = math.erfc(math.sqrt(chisquared / 2))
 
     # A high p-value means that we accept the null hypothesis that there is no
     # difference between the actual and observed results. A low p-value means
@@ -229,4 +339,6 @@ def chisq_test(true_positives, true_negatives, false_positives, false_negatives)
     significance = pvalue > alpha
 
     return (chisquared, pvalue, significance)
-main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+######################################################################
+# generate.py                                                        #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Generate synthetic NOAA storm files, CSV coordinates and KML       #
+# documents of any size for the benchmarks.                          #
+#                                                                    #
+######################################################################
+
+import csv
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'kmlutils'))
+from kmlwriter import KMLWriter, BUFFER_SIZE
+from options import parse_options
+
+# The names of the files that are generated in the data directory.
+LOCATIONS_FILE = 'locations.csv'
+DETAILS_FILE = 'details.csv'
+POINTS_FILE = 'points.csv'
+KML_FILE = 'points.kml'
+
+LOCATIONS_HEADER = ['YEARMONTH', 'EPISODE_ID', 'EVENT_ID', 'LOCATION_INDEX',
+        'RANGE', 'AZIMUTH', 'LOCATION', 'LATITUDE', 'LONGITUDE', 'LAT2',
+        'LON2']
+DETAILS_HEADER = ['BEGIN_YEARMONTH', 'BEGIN_DAY', 'BEGIN_TIME',
+        'END_YEARMONTH', 'END_DAY', 'END_TIME', 'EPISODE_ID', 'EVENT_ID',
+        'STATE', 'STATE_FIPS', 'YEAR', 'MONTH_NAME', 'EVENT_TYPE', 'CZ_TYPE',
+        'CZ_FIPS', 'CZ_NAME']
+
+# Event types are picked with about the same frequencies as in the real files.
+EVENT_TYPES = [('Thunderstorm Wind', 30), ('Hail', 18), ('Flash Flood', 8),
+        ('Flood', 5), ('Heavy Rain', 4), ('Tornado', 3), ('Funnel Cloud', 2),
+        ('Lightning', 1), ('Marine Thunderstorm Wind', 2), ('Heavy Snow', 2),
+        ('Winter Storm', 2), ('Winter Weather', 2), ('High Wind', 2),
+        ('Strong Wind', 1), ('Drought', 1), ('Waterspout', 1)]
+AZIMUTHS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+        'August', 'September', 'October', 'November', 'December']
+
+# EVENT_IDs are scattered over a range of numbers from the first one, by
+# multiplying the number of each event by a step that has no factors in common
+# with the size of the range.
+FIRST_EVENT_ID = 500000
+EVENT_ID_RANGE = 10 ** 9
+EVENT_ID_STEP = 3 ** 18
+
+# Sizes can be given with these suffixes.
+SIZE_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+def main():
+    try:
+        options, file_args = parse_options(sys.argv[1:], {'-s': '0'},
+                {'--seed': '-s'})
+        seed = int(options['-s'])
+        if len(file_args) != 2:
+            raise ValueError('expected SIZE and DIRECTORY')
+        size = parse_size(file_args[0])
+    except ValueError:
+        print_usage()
+
+    generate_all(size, file_args[1], seed)
+
+# Parse a number of records like "10000", "10k" or "1M".
+def parse_size(value):
+    multiplier = SIZE_SUFFIXES.get(value[-1:].lower(), 1)
+    if multiplier != 1:
+        value = value[:-1]
+    size = int(float(value) * multiplier)
+    if size < 1:
+        raise ValueError('the size must be at least 1')
+    return size
+
+# Generate every kind of file with size records each in a directory.
+def generate_all(size, directory, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    generate_noaa(size, os.path.join(directory, LOCATIONS_FILE),
+            os.path.join(directory, DETAILS_FILE), seed)
+    generate_points(size, os.path.join(directory, POINTS_FILE), seed)
+    generate_kml(size, os.path.join(directory, KML_FILE), seed)
+
+# Yield size random (longitude, latitude) points around the United States, as
+# strings with the number of decimal places that NOAA uses.
+def iter_random_points(size, seed):
+    generator = random.Random(seed)
+    for point_number in range(size):
+        yield ('{:.4f}'.format(generator.uniform(-125, -67)),
+                '{:.4f}'.format(generator.uniform(25, 49)))
+
+# Like in the real files, neither file is sorted by EVENT_ID, and the two files
+# list the events in different orders.
+def event_id(event_number):
+    return FIRST_EVENT_ID + event_number * EVENT_ID_STEP % EVENT_ID_RANGE
+
+# Yield the numbers from 0 to count - 1 in a scrambled order, without having to
+# keep them all in memory to shuffle them.
+def scrambled_range(count, seed):
+    step = random.Random(seed).randrange(count // 2, count + 1)
+    while math.gcd(step, count) != 1:
+        step += 1
+    return (number * step % count for number in range(count))
+
+# Write a NOAA locations file with size rows and the details file of its
+# events. Each event has one to three locations.
+def generate_noaa(size, locations_file, details_file, seed=0):
+    generator = random.Random(seed + 1)
+    points = iter_random_points(size, seed + 2)
+    remaining = size
+    event_count = 0
+    with open(locations_file, 'w', newline='',
+            buffering=BUFFER_SIZE) as locations:
+        writer = csv.writer(locations)
+        writer.writerow(LOCATIONS_HEADER)
+        while remaining > 0:
+            location_count = min(generator.randint(1, 3), remaining)
+            for location_index in range(1, location_count + 1):
+                longitude, latitude = next(points)
+                writer.writerow([201400 + generator.randint(1, 12),
+                    event_count // 3, event_id(event_count), location_index,
+                    generator.randint(0, 9), generator.choice(AZIMUTHS),
+                    'PLACE{}'.format(event_count % 997), latitude, longitude,
+                    latitude.replace('.', '')[:4],
+                    longitude.lstrip('-').replace('.', '')[:5]])
+            remaining -= location_count
+            event_count += 1
+
+    types = [event_type for event_type, weight in EVENT_TYPES
+            for repeat in range(weight)]
+    with open(details_file, 'w', newline='', buffering=BUFFER_SIZE) as details:
+        writer = csv.writer(details)
+        writer.writerow(DETAILS_HEADER)
+        for event_number in scrambled_range(event_count, seed + 3):
+            month = generator.randint(1, 12)
+            writer.writerow([201400 + month, generator.randint(1, 28),
+                generator.randint(0, 2359), 201400 + month,
+                generator.randint(1, 28), generator.randint(0, 2359),
+                event_number // 3, event_id(event_number), 'KANSAS', 20, 2014,
+                MONTHS[month - 1], generator.choice(types), 'C',
+                generator.randint(1, 200), 'COUNTY'])
+
+# Write a tab separated file of size points for csv2kml.py.
+def generate_points(size, points_file, seed=0):
+    with open(points_file, 'w', buffering=BUFFER_SIZE) as points:
+        for longitude, latitude in iter_random_points(size, seed + 4):
+            points.write(longitude + '\t' + latitude + '\n')
+
+# Write a KML document with size named placemarks.
+def generate_kml(size, kml_file, seed=0):
+    with KMLWriter(kml_file, container='Folder') as kml:
+        for point_number, (longitude, latitude) in enumerate(
+                iter_random_points(size, seed + 5)):
+            kml.write_placemark(longitude, latitude,
+                    'Storm {}'.format(point_number))
+
+def print_usage():
+    print((
+        'Usage: {} [-s=SEED] SIZE DIRECTORY\n'
+        'SIZE is the number of records in each file, like 10k, 1M or 10M'
+        ).format(sys.argv[0]), file=sys.stderr)
+    exit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+######################################################################
+# run.py                                                             #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Time each of the command line scripts end to end on generated      #
+# data and add the results to a JSON file, so that they can be       #
+# compared between commits.                                          #
+#                                                                    #
+######################################################################
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIRECTORY = os.path.dirname(BENCHMARKS_DIRECTORY)
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, 'kmlutils'))
+from options import parse_options
+
+import generate
+
+# Generated data is kept here, in a directory for each size, so that it only
+# has to be generated once.
+DATA_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, 'data')
+RESULTS_FILE = os.path.join(BENCHMARKS_DIRECTORY, 'results.json')
+
+# Each benchmark's name, the script it runs, the arguments to the script and
+# the number of input rows it handles per record in the data. '{data}' and
+# '{output}' in the arguments are replaced by the data directory and an output
+# directory.
+BENCHMARKS = [
+    ('csv2kml', 'kmlutils/csv2kml.py',
+        ['{data}/points.csv', '{output}/points.kml'], 1),
+    ('kml2csv', 'kmlutils/kml2csv.py',
+        ['{data}/points.kml', '{output}/points.csv'], 1),
+    ('kmlmerge', 'kmlutils/kmlmerge.py',
+        ['{data}/points.kml', '{data}/points.kml', '{output}/merged.kml'], 2),
+    ('noaa2kml', 'noaa2kml.py',
+        ['{data}/locations.csv', '{data}/details.csv', '{output}/storms.kml'],
+        1),
+    ('refine_noaa', 'refine_noaa.py',
+        ['{data}/locations.csv', '{data}/details.csv',
+            '{output}/storms.tsv'], 1),
+]
+
+def main():
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                {'-s': '10k', '-r': '1', '-o': RESULTS_FILE, '-b': None},
+                {'--size': '-s', '--repeat': '-r', '--output': '-o',
+                    '--benchmarks': '-b'})
+        size = generate.parse_size(options['-s'])
+        repeat = int(options['-r'])
+        if options['-b'] is None:
+            names = [benchmark[0] for benchmark in BENCHMARKS]
+        else:
+            names = options['-b'].split(',')
+    except ValueError:
+        print_usage()
+    known_names = [benchmark[0] for benchmark in BENCHMARKS]
+    if file_args or repeat < 1 or any(name not in known_names
+            for name in names):
+        print_usage()
+
+    data_directory = os.path.join(DATA_DIRECTORY, str(size))
+    if not os.path.exists(os.path.join(data_directory, generate.KML_FILE)):
+        print('Generating {} records in {}'.format(size, data_directory),
+                file=sys.stderr)
+        generate.generate_all(size, data_directory)
+
+    run = {'commit': current_commit(),
+           'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+           'python': platform.python_version(),
+           'machine': platform.machine(),
+           'cpus': os.cpu_count(),
+           'size': size,
+           'results': []}
+    for name, script, arguments, rows_per_record in BENCHMARKS:
+        if name not in names:
+            continue
+        result = run_benchmark(script, arguments, data_directory, repeat)
+        result['name'] = name
+        result['rows'] = size * rows_per_record
+        result['rows_per_second'] = result['rows'] / result['seconds']
+        run['results'].append(result)
+        print('{:<12} {:>8.2f} s {:>12.0f} rows/s {:>8.1f} MB peak{}'.format(
+            name, result['seconds'], result['rows_per_second'],
+            result['peak_rss_kb'] / 1024,
+            '' if result['returncode'] == 0 else '  FAILED ({})'.format(
+                result['returncode'])))
+
+    add_run(options['-o'], run)
+
+# Run a script repeat times and return the fastest wall time, the largest peak
+# resident set size and the exit status of the last run. The peak comes from
+# the resource usage that wait4 reports for the script's process. Everything
+# the script writes goes in a fresh output directory, which is deleted
+# afterward.
+def run_benchmark(script, arguments, data_directory, repeat):
+    result = {'seconds': float('inf'), 'peak_rss_kb': 0}
+    for run_number in range(repeat):
+        # The NOAA scripts build an index of the details file the first time
+        # they read it. It is removed so that every run does the same work.
+        index_file = os.path.join(data_directory,
+                generate.DETAILS_FILE + '.index')
+        if os.path.exists(index_file):
+            os.remove(index_file)
+
+        output_directory = os.path.join(data_directory, 'output')
+        shutil.rmtree(output_directory, ignore_errors=True)
+        os.makedirs(output_directory)
+        command = [sys.executable, os.path.join(REPOSITORY_DIRECTORY, script)]
+        command += [argument.format(data=data_directory,
+            output=output_directory) for argument in arguments]
+
+        try:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL)
+            pid, status, usage = os.wait4(process.pid, 0)
+            seconds = time.perf_counter() - start
+            process.returncode = os.waitstatus_to_exitcode(status)
+        finally:
+            shutil.rmtree(output_directory, ignore_errors=True)
+
+        result['seconds'] = min(result['seconds'], seconds)
+        # ru_maxrss is in kilobytes on Linux.
+        result['peak_rss_kb'] = max(result['peak_rss_kb'], usage.ru_maxrss)
+        result['returncode'] = process.returncode
+    return result
+
+# The commit that is checked out, with "-dirty" added if there are changes
+# that aren't committed.
+def current_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True,
+                check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain',
+            '--untracked-files=no'], cwd=REPOSITORY_DIRECTORY,
+            capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if changes else '')
+
+# Add a run to the list of runs in a results file.
+def add_run(results_file, run):
+    runs = []
+    if os.path.exists(results_file):
+        with open(results_file) as results:
+            runs = json.load(results)
+    runs.append(run)
+
+    temporary_file = results_file + '.tmp'
+    with open(temporary_file, 'w') as results:
+        json.dump(runs, results, indent=2)
+        results.write('\n')
+    os.replace(temporary_file, results_file)
+
+def print_usage():
+    print((
+        'Usage: {} [-s=SIZE] [-r=REPEAT] [-b=BENCHMARKS] [-o=RESULTS_FILE]\n'
+        'SIZE is the number of records to generate, like 10k (the default), '
+        '1M or 10M\n'
+        'REPEAT is the number of times to run each script; the fastest run '
+        'is kept\n'
+        'BENCHMARKS is a comma separated list of: {}\n'
+        'The results are added to RESULTS_FILE (default '
+        'benchmarks/results.json)'
+        ).format(sys.argv[0], ', '.join(benchmark[0]
+            for benchmark in BENCHMARKS)), file=sys.stderr)
+    exit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+######################################################################
+# classifiers.py                                                     #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Classifiers for storm locations that work the same way as mlpy's   #
+# KNN and LDAC, but predict a whole array of locations at once.      #
+#                                                                    #
+######################################################################
+
+import numpy as np
+
+# Points are predicted this many at a time, so that the vote counts for a very
+# large set of points don't have to be held in memory all at once.
+BATCH_SIZE = 100000
+
+# Turn (longitude, latitude) pairs in degrees into points on the unit sphere.
+# The straight line distance between two of these points grows with the
+# distance along the surface of the Earth, so their nearest neighbors are the
+# same as with the haversine distance.
+def unit_vectors(locations):
+    longitudes = np.radians(locations[:, 0])
+    latitudes = np.radians(locations[:, 1])
+    return np.column_stack((np.cos(latitudes) * np.cos(longitudes),
+        np.cos(latitudes) * np.sin(longitudes), np.sin(latitudes)))
+
+# Make sure that t is a 2d array of points. Returns the array and whether t
+# was a single point.
+def as_points(t):
+    t = np.asarray(t, dtype=float)
+    if t.ndim == 1:
+        return t.reshape(1, -1), True
+    return t, False
+
+# k-Nearest Neighbor classification with a k-d tree.
+class KNN:
+    # metric is 'euclidean' to compare the points as they are, or 'haversine'
+    # for (longitude, latitude) points in degrees. The neighbors of the points
+    # are found on workers processors, or all of them if it's -1.
+    def __init__(self, k=1, metric='euclidean', workers=-1):
+        if metric not in ['euclidean', 'haversine']:
+            raise ValueError('unknown metric: {}'.format(metric))
+        self.k = k
+        self.metric = metric
+        self.workers = workers
+        self.tree = None
+
+    def learn(self, x, y):
+        x = as_points(x)[0]
+        self.classes, self.y = np.unique(np.asarray(y, dtype=int),
+                return_inverse=True)
+        if self.metric == 'haversine':
+            x = unit_vectors(x)
+        # scipy is only imported when it is needed, since it is slow to
+        # import.
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(x)
+
+    # Predict the class of one point, or of each point in a 2d array. Each
+    # point gets the class that most of its k nearest neighbors have. A tie
+    # goes to the class of the nearest of the tied neighbors.
+    def pred(self, t):
+        if self.tree is None:
+            raise ValueError('no model computed')
+
+        t, single = as_points(t)
+        k = min(self.k, self.tree.n)
+        predictions = np.empty(len(t), dtype=self.classes.dtype)
+        for start in range(0, len(t), BATCH_SIZE):
+            batch = t[start:start + BATCH_SIZE]
+            if self.metric == 'haversine':
+                batch = unit_vectors(batch)
+            distances, neighbors = self.tree.query(batch, k=k,
+                    workers=self.workers)
+            labels = self.y[neighbors.reshape(len(batch), k)]
+
+            rows = np.arange(len(batch))
+            votes = np.zeros((len(batch), len(self.classes)), dtype=int)
+            nearest = np.zeros((len(batch), len(self.classes)), dtype=int)
+            for rank in reversed(range(k)):
+                votes[rows, labels[:, rank]] += 1
+                nearest[rows, labels[:, rank]] = k - rank
+            predictions[start:start + len(batch)] = self.classes[
+                    np.argmax(votes * (k + 1) + nearest, axis=1)]
+
+        if single:
+            return predictions[0]
+        return predictions
+
+    def labels(self):
+        return self.classes
+
+# Linear Discriminant Analysis classification. Each class is modeled as a
+# normal distribution with its own mean and a covariance shared by all of the
+# classes, which gives a linear discriminant function for each class.
+class LDAC:
+    def __init__(self):
+        self.weights = None
+
+    def learn(self, x, y):
+        x = as_points(x)[0]
+        self.classes, y = np.unique(np.asarray(y, dtype=int),
+                return_inverse=True)
+        counts = np.bincount(y, minlength=len(self.classes))
+
+        means = np.zeros((len(self.classes), x.shape[1]))
+        np.add.at(means, y, x)
+        means /= counts[:, np.newaxis]
+
+        centered = x - means[y]
+        covariance = centered.T @ centered / max(len(x) - len(self.classes), 1)
+        inverse = np.linalg.pinv(covariance)
+
+        self.weights = means @ inverse
+        self.biases = (-0.5 * np.sum(self.weights * means, axis=1) +
+                np.log(counts / len(x)))
+
+    # Predict the class of one point, or of each point in a 2d array.
+    def pred(self, t):
+        if self.weights is None:
+            raise ValueError('no model computed')
+
+        t, single = as_points(t)
+        predictions = np.empty(len(t), dtype=self.classes.dtype)
+        for start in range(0, len(t), BATCH_SIZE):
+            scores = t[start:start + BATCH_SIZE] @ self.weights.T + self.biases
+            predictions[start:start + len(scores)] = self.classes[
+                    np.argmax(scores, axis=1)]
+
+        if single:
+            return predictions[0]
+        return predictions
+
+    # The weights and bias of the discriminant function of each class, in the
+    # order of labels().
+    def w(self):
+        return self.weights
+
+    def bias(self):
+        return self.biases
+
+    def labels(self):
+        return self.classes
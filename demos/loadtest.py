@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# loadtest.py: measure how many requests per second radius.py can answer. The
+# wsgi application is called directly, so this measures the script itself and
+# not a web server. Requests are spread over a number of random views around
+# the storms, so that some of them are answered from the cache and some aren't.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'kmlutils'))
+from options import parse_options
+
+import radius
+
+def main():
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                {'-n': '10000', '-v': '500', '-s': '0'},
+                {'--requests': '-n', '--views': '-v', '--seed': '-s'})
+        request_count = int(options['-n'])
+        view_count = int(options['-v'])
+        random.seed(int(options['-s']))
+    except ValueError:
+        print_usage()
+    if file_args or request_count < 1 or view_count < 1:
+        print_usage()
+
+    # Open the index before the clock starts, the same as a server that has
+    # already answered its first request.
+    index = radius.get_index()
+    points = index.query_bbox(-180, -90, 180, 90)
+    if not points:
+        print('There are no placemarks in ' + radius.STORMS_KML,
+                file=sys.stderr)
+        exit()
+
+    views = [random_view(points) for view_number in range(view_count)]
+    requests = [random.choice(views) for request_number in range(request_count)]
+
+    status_counts = {}
+    response_bytes = 0
+    def start_response(status, response_headers):
+        status_counts[status] = status_counts.get(status, 0) + 1
+
+    for label, environ_of in [
+            ('plain', lambda view: {'QUERY_STRING': view}),
+            ('gzip', lambda view: {'QUERY_STRING': view,
+                'HTTP_ACCEPT_ENCODING': 'gzip'}),
+            ('revalidate', lambda view: {'QUERY_STRING': view,
+                'HTTP_IF_NONE_MATCH': etags[view]})]:
+        radius.kml_bbox.cache_clear()
+        etags = {}
+        for view in views:
+            headers = []
+            radius.application({'QUERY_STRING': view},
+                    lambda status, response_headers:
+                        headers.extend(response_headers))
+            etags[view] = dict(headers)['ETag']
+        if label != 'revalidate':
+            radius.kml_bbox.cache_clear()
+
+        status_counts.clear()
+        response_bytes = 0
+        start = time.perf_counter()
+        for view in requests:
+            for part in radius.application(environ_of(view), start_response):
+                response_bytes += len(part)
+        seconds = time.perf_counter() - start
+
+        cache_info = radius.kml_bbox.cache_info()
+        print('{:<10} {:>10.0f} requests/s {:>8.1f} MB/s  cache {}/{} hits  '
+                '{}'.format(label, request_count / seconds,
+                    response_bytes / seconds / 1e6, cache_info.hits,
+                    cache_info.hits + cache_info.misses,
+                    ', '.join('{} x{}'.format(status, count)
+                        for status, count in sorted(status_counts.items()))))
+
+# Make a BBOX query string for a view of a few degrees around one of the
+# placemarks.
+def random_view(points):
+    longitude, latitude = random.choice(points)[:2]
+    width = random.uniform(0.5, 8)
+    height = width * random.uniform(0.5, 1)
+    return 'BBOX={:.4f},{:.4f},{:.4f},{:.4f}'.format(longitude - width / 2,
+            latitude - height / 2, longitude + width / 2,
+            latitude + height / 2)
+
+def print_usage():
+    print((
+        'Usage: {} [-n=REQUESTS] [-v=VIEWS] [-s=SEED]\n'
+        'REQUESTS is the number of requests to make (default 10000)\n'
+        'VIEWS is the number of different views they are spread over '
+        '(default 500)\n'
+        'The placemarks are read from $STORMS_KML, like radius.py'
+        ).format(sys.argv[0]), file=sys.stderr)
+    exit()
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,120 @@
 #!/usr/bin/env python3
 
-# radius.py: a wsgi script that serves a KML document that contains a placemark
-# in a random position on a circle around another point.
+# radius.py: a wsgi script that serves KML to Google Earth NetworkLinks.
+#
+# A request with a BBOX=west,south,east,north query string, which is what a
+# NetworkLink with <viewFormat>BBOX=[bboxWest],[bboxSouth],[bboxEast],[bboxNorth]
+# </viewFormat> sends, gets the storm placemarks in that part of the view. They
+# are found with a grid index of the KML file in the STORMS_KML environment
+# variable, or truncated_storms_with_type.kml next to this script. If the index
+# can't be saved next to the KML file, it is built in memory. Any other
+# request gets a placemark in a random position on a circle around another
+# point.
+
+import functools
+import gzip
+import hashlib
+import io
+import math
+import os
+import sys
+import threading
+from random import random
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'kmlutils'))
+from kmlwriter import KMLWriter
+from spatialindex import GridIndex
+
+STORMS_KML = os.environ.get('STORMS_KML', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'truncated_storms_with_type.kml'))
+
+# Bounding boxes are rounded out to multiples of this many degrees, so that
+# views that are almost the same share a response in the cache.
+BBOX_QUANTUM = 0.25
+
+# The number of responses that are kept in the cache.
+CACHE_SIZE = 256
+
+# A response holds at most this many placemarks, spread out evenly over the
+# ones in the bounding box.
+MAX_PLACEMARKS = 5000
+
+KML_CONTENT_TYPE = 'application/vnd.google-earth.kml+xml; charset=utf-8'
+
+index = None
+index_lock = threading.Lock()
 
 def application(environ, start_response):
-    output_kml = kml_radius(40, -100, 5)
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    if 'BBOX' not in query:
+        output_kml = kml_radius(40, -100, 5)
+
+        status = '200 OK'
+        response_headers = [('Content-Type', KML_CONTENT_TYPE),
+                            ('Content-Length', str(len(output_kml)))]
+        start_response(status, response_headers)
+
+        return [output_kml]
+
+    try:
+        bbox = quantize_bbox(*[float(number)
+            for number in query['BBOX'][0].split(',')])
+    except (TypeError, ValueError):
+        start_response('400 Bad Request', [('Content-Type', 'text/plain')])
+        return [b'BBOX must be west,south,east,north\n']
 
-    status = '200 OK'
-    response_headers = [('Content-Type', 'application/vnd.google-earth.kml+xml; charset=utf-8'),
-                        ('Content-Length', str(len(output_kml)))]
-    start_response(status, response_headers)
+    output_kml, compressed_kml, etag = kml_bbox(*bbox)
+
+    response_headers = [('Content-Type', KML_CONTENT_TYPE),
+                        ('ETag', etag),
+                        ('Cache-Control', 'max-age=60'),
+                        ('Vary', 'Accept-Encoding')]
+    if_none_match = [tag.strip()
+            for tag in environ.get('HTTP_IF_NONE_MATCH', '').split(',')]
+    if etag in if_none_match or '*' in if_none_match:
+        start_response('304 Not Modified', response_headers)
+        return []
+
+    if accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING', '')):
+        output_kml = compressed_kml
+        response_headers.append(('Content-Encoding', 'gzip'))
+    response_headers.append(('Content-Length', str(len(output_kml))))
+    start_response('200 OK', response_headers)
 
     return [output_kml]
 
-def kml_radius(lat, lon, radius):
-    from math import sin, cos, pi
-    from random import random
+# Check whether an Accept-Encoding header allows a gzip response. Each coding
+# can have a q-value, and one of 0 means the coding is not acceptable. gzip is
+# also accepted through * if it isn't listed itself.
+def accepts_gzip(accept_encoding):
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, parameters = coding.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            key, _, value = parameter.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
 
-    angle = random() * pi
-    latitude = lat + radius * sin(angle)
-    longitude = lon + radius * cos(angle)
+    for name in ['gzip', 'x-gzip', '*']:
+        if name in qualities:
+            return qualities[name] > 0
+    return False
+
+def kml_radius(lat, lon, radius):
+    angle = random() * math.pi
+    latitude = lat + radius * math.sin(angle)
+    longitude = lon + radius * math.cos(angle)
 
     kml = (
             '<?xml version="1.0" encoding="UTF-8"?>\n'
@@ -34,3 +129,49 @@ def kml_radius(lat, lon, radius):
             ).format(longitude, latitude).encode('utf-8')
 
     return kml
+
+# Round a bounding box out to the edges of the BBOX_QUANTUM grid and keep it on
+# the globe. A box with west greater than east crosses the antimeridian.
+def quantize_bbox(west, south, east, north):
+    if not all(map(math.isfinite, [west, south, east, north])):
+        raise ValueError('BBOX is not finite')
+    if east - west >= 360:
+        west, east = -180, 180
+    elif west < -180 or west > 180 or east < -180 or east > 180:
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+    west = max(math.floor(west / BBOX_QUANTUM) * BBOX_QUANTUM, -180)
+    east = min(math.ceil(east / BBOX_QUANTUM) * BBOX_QUANTUM, 180)
+    south, north = min(south, north), max(south, north)
+    south = max(math.floor(south / BBOX_QUANTUM) * BBOX_QUANTUM, -90)
+    north = min(math.ceil(north / BBOX_QUANTUM) * BBOX_QUANTUM, 90)
+    return west, south, east, north
+
+# The index is opened by the first request that needs it and then shared by
+# every request after that.
+def get_index():
+    global index
+    with index_lock:
+        if index is None:
+            index = GridIndex(STORMS_KML)
+        return index
+
+# Build the KML document for a quantized bounding box. Returns the document,
+# the document compressed with gzip and its ETag, which are kept in the cache
+# for the next request for the same box.
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def kml_bbox(west, south, east, north):
+    index = get_index()
+    points = index.query_bbox(west, south, east, north)
+    if len(points) > MAX_PLACEMARKS:
+        points = [points[point_number * len(points) // MAX_PLACEMARKS]
+                for point_number in range(MAX_PLACEMARKS)]
+
+    text = io.StringIO()
+    with KMLWriter(text, container='Folder') as kml:
+        for longitude, latitude, offset, length in points:
+            kml.write_fragment(index.placemark_text(offset, length))
+
+    output_kml = text.getvalue().encode('utf-8')
+    etag = '"{}"'.format(hashlib.sha1(output_kml).hexdigest()[:20])
+    return output_kml, gzip.compress(output_kml, 6), etag
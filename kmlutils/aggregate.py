@@ -0,0 +1,75 @@
+######################################################################
+# aggregate.py                                                       #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Bin points into a grid of cells and write one placemark for each   #
+# cell, with the number of points in it and how many there are of   #
+# each name, instead of a placemark for every point.                 #
+#                                                                    #
+######################################################################
+
+import math
+from collections import Counter
+
+# Bin (longitude, latitude) or (longitude, latitude, name) points into a grid
+# of cells that are cell_size degrees on a side, in one pass. The points are
+# not kept, only a count, the sum of the coordinates and a count of each name
+# for each cell, so this works for any number of points. Returns a dictionary
+# from (row, column) to [count, longitude sum, latitude sum, name counts].
+# Points whose coordinates aren't finite numbers are skipped.
+def aggregate_points(points, cell_size):
+    cells = {}
+    for point in points:
+        try:
+            longitude = float(point[0])
+            latitude = float(point[1])
+            if not (math.isfinite(longitude) and math.isfinite(latitude)):
+                continue
+        except ValueError:
+            continue
+
+        key = (math.floor(latitude / cell_size),
+                math.floor(longitude / cell_size))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, 0.0, 0.0, Counter()]
+        cell[0] += 1
+        cell[1] += longitude
+        cell[2] += latitude
+        if len(point) > 2 and point[2] is not None:
+            cell[3][point[2]] += 1
+    return cells
+
+# Add the counts of one set of cells from aggregate_points to another.
+def merge_cells(cells, other_cells):
+    for key, other_cell in other_cells.items():
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = other_cell
+            continue
+        cell[0] += other_cell[0]
+        cell[1] += other_cell[1]
+        cell[2] += other_cell[2]
+        cell[3].update(other_cell[3])
+    return cells
+
+# Write a Placemark for each cell with an open KMLWriter, in order from south
+# to north and west to east. Each Placemark is at the average position of the
+# points in its cell and is named for the number of points. Its description
+# lists the number of points with each name, most common first.
+def write_cells(kml, cells):
+    for key in sorted(cells):
+        count, longitude_sum, latitude_sum, names = cells[key]
+        description = None
+        if names:
+            description = '\n'.join('{}: {}'.format(name, name_count)
+                    for name, name_count in sorted(names.items(),
+                        key=lambda item: (-item[1], item[0])))
+        kml.write_placemark(format_coordinate(longitude_sum / count),
+                format_coordinate(latitude_sum / count), str(count),
+                description)
+
+# Coordinates are written to six decimal places, which is about 10 cm.
+def format_coordinate(value):
+    return repr(round(value, 6))
@@ -0,0 +1,142 @@
+######################################################################
+# compressed.py                                                      #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Read input files that are compressed with gzip, bzip2 or xz as if  #
+# they weren't, decompressing them in a background thread while the  #
+# caller parses what has already been decompressed.                  #
+#                                                                    #
+######################################################################
+
+import bz2
+import functools
+import io
+import lzma
+import os.path
+import queue
+import threading
+import zlib
+
+# The decompressors for each kind of compressed file, by its extension. The
+# gzip decompressor is zlib's, told to expect a gzip header.
+DECOMPRESSORS = {
+        '.gz': functools.partial(zlib.decompressobj, 16 + zlib.MAX_WBITS),
+        '.bz2': bz2.BZ2Decompressor,
+        '.xz': lzma.LZMADecompressor}
+
+# Decompressed input is buffered in blocks of this many bytes.
+BUFFER_SIZE = 1024 * 1024
+
+# Compressed input is read this many bytes at a time.
+COMPRESSED_READ_SIZE = 256 * 1024
+
+# The background thread gets at most this many blocks ahead of the reader.
+QUEUE_SIZE = 8
+
+def is_compressed(file_name):
+    return os.path.splitext(file_name)[1].lower() in DECOMPRESSORS
+
+# Open an input file for reading in binary ('rb') or text ('r') mode. If its
+# name ends in .gz, .bz2 or .xz, it is decompressed as it is read. Compressed
+# files can't be seeked in, except forward by reading, so ranges of them can't
+# be read on their own.
+def open_input(file_name, mode='rb', encoding=None, newline=None):
+    if not is_compressed(file_name):
+        return open(file_name, mode, buffering=BUFFER_SIZE, encoding=encoding,
+                newline=newline)
+
+    reader = io.BufferedReader(ThreadedReader(file_name), BUFFER_SIZE)
+    if 'b' in mode:
+        return reader
+    return io.TextIOWrapper(reader, encoding=encoding, newline=newline)
+
+# A raw binary file of the decompressed contents of a compressed file. A thread
+# decompresses the file into a queue of blocks ahead of the reader. zlib, bz2
+# and lzma all let go of the GIL while they decompress, so the decompression
+# really does run at the same time as the parsing. The decompressors are given
+# large pieces of the file at a time rather than going through gzip.open and
+# the like, which read it 8 KB at a time and so have to wait for the GIL much
+# more often.
+class ThreadedReader(io.RawIOBase):
+    def __init__(self, file_name):
+        self.new_decompressor = DECOMPRESSORS[
+                os.path.splitext(file_name)[1].lower()]
+        self.compressed_file = open(file_name, 'rb')
+        self.blocks = queue.Queue(QUEUE_SIZE)
+        self.block = b''
+        self.offset = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.decompress, daemon=True)
+        self.thread.start()
+
+    # Decompress the file into the queue of blocks, ending with an empty block.
+    # A file can be made of several compressed streams one after another, like
+    # the output of cat a.gz b.gz. An error is passed on to the reader in place
+    # of a block, including an EOFError if the file ends in the middle of a
+    # stream.
+    def decompress(self):
+        try:
+            decompressor = self.new_decompressor()
+            in_stream = False
+            while not self.stopping.is_set():
+                data = self.compressed_file.read(COMPRESSED_READ_SIZE)
+                if not data:
+                    if in_stream:
+                        raise EOFError('compressed file ended before the '
+                                'end of the stream')
+                    break
+                while data:
+                    in_stream = True
+                    block = decompressor.decompress(data)
+                    if block:
+                        self.put(block)
+                    data = b''
+                    if decompressor.eof:
+                        # Anything after the end of the stream is the start of
+                        # another one, or padding.
+                        data = decompressor.unused_data.lstrip(b'\0')
+                        decompressor = self.new_decompressor()
+                        in_stream = False
+            self.put(b'')
+        except Exception as error:
+            self.put(error)
+
+    # Put a block in the queue, giving up if the reader is closed while the
+    # queue is full.
+    def put(self, block):
+        while not self.stopping.is_set():
+            try:
+                self.blocks.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    # The block is None once the end of the file has been reached.
+    def readinto(self, buffer):
+        if self.block is None:
+            return 0
+        if self.offset == len(self.block):
+            block = self.blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self.block = None
+                return 0
+            self.block = memoryview(block)
+            self.offset = 0
+
+        size = min(len(buffer), len(self.block) - self.offset)
+        buffer[:size] = self.block[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stopping.set()
+            self.thread.join()
+            self.compressed_file.close()
+        super().close()
@@ -9,112 +9,215 @@
 ######################################################################
 
 import os.path
-import re
 import sys
 
+from aggregate import aggregate_points, merge_cells, write_cells
+from compressed import is_compressed
+from kmlwriter import KMLWriter, KMLFragmentWriter
+from options import parse_options, parse_jobs
+from parallel import iter_pieces, iter_results, copy_piece
+from simplify import PathSimplifier
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
+from streams import read_section_name, iter_csv_point_lists
+
+# With more than one job, files are split into chunks of this many bytes.
+CHUNK_SIZE = 32 * 1024 * 1024
+
 def main():
     if len(sys.argv) < 3:
         print_usage()
 
-    # Determine the type of KML element based on the -t option
-    # first_file_arg is the argument where the first file should be found.
+    # Determine the type of KML element based on the -t option, the number
+    # of processes to use based on the -j option, the size of the grid
+    # cells to combine the points in based on the -g option and how far paths
+    # can be moved when they are simplified based on the -s option.
     # The -t=path and -t path syntaxes are both acceptable
-    if sys.argv[1] == '-t':
-        kml_type = sys.argv[2]
-        first_file_arg = 3
-    elif sys.argv[1].startswith('-t='):
-        kml_type = sys.argv[1].split('=')[1]
-        first_file_arg = 2
-    else:
-        kml_type = 'placemark'
-        first_file_arg = 1
-
-    # Make sure the KML type is valid
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                dict({'-t': 'placemark', '-j': '1', '-g': None, '-s': None},
+                    **STATS_OPTIONS),
+                {'--jobs': '-j', '--grid': '-g', '--simplify': '-s'})
+        kml_type = options['-t']
+        jobs = parse_jobs(options['-j'])
+        if options['-g'] is None:
+            cell_size = None
+        else:
+            cell_size = float(options['-g'])
+            if not cell_size > 0:
+                raise ValueError('the grid cells must have a size')
+        if options['-s'] is None:
+            tolerance = None
+        else:
+            tolerance = float(options['-s'])
+            if not tolerance >= 0:
+                raise ValueError('the tolerance can not be negative')
+    except ValueError:
+        print_usage()
+
+    # Make sure the KML type is valid. Only placemarks can be combined in a
+    # grid, and only paths can be simplified. Paths are simplified as they are
+    # read, so they can't be split between processes.
     if not kml_type in ['placemark', 'path']:
         print_usage()
+    if cell_size is not None and kml_type != 'placemark':
+        print_usage()
+    if tolerance is not None and (kml_type != 'path' or jobs > 1):
+        print_usage()
 
     # If there aren't enough file arguments, display the usage message and exit.
-    if len(sys.argv) < 2 + first_file_arg:
+    if len(file_args) < 2:
         print_usage()
+    input_files = file_args[:-1]
+    output = file_args[-1]
 
     # Check if the output file already exists
-    if os.path.exists(sys.argv[-1]):
-        user_response = input(sys.argv[-1] + ' already exists. Overwrite it? [y/N] ')
+    if os.path.exists(output):
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
         if user_response == '' or user_response[0] != 'y':
             exit()
 
-    # Strings containing the text of the resulting KML document.
-    if kml_type == 'placemark':
-        header = ('<?xml version="1.0" encoding="UTF-8"?>\n'
-                  '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
-                  '<Document>\n')
-        body = ''
-        section_header = '\t<Folder>\n'
-        section = ('\t\t<Placemark>\n'
-                   '\t\t\t<Point>\n'
-                   '\t\t\t\t<coordinates>{},{}</coordinates>\n'
-                   '\t\t\t</Point>\n'
-                   '\t\t</Placemark>\n')
-        section_footer = '\t</Folder>\n'
-        footer = ('</Document>\n'
-                  '</kml>\n')
-
-    elif kml_type == 'path':
-        header  = ('<?xml version="1.0" encoding="UTF-8"?>\n'
-                   '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
-                   '<Document>\n')
-        body =  ''
-        section_header = ('<Placemark>\n'
-                          '\t\t<LineString>\n'
-                          '\t\t\t<extrude>0</extrude>\n'
-                          '\t\t\t<tessellate>1</tessellate>\n'
-                          '\t\t\t<altitudeMode>clampToGround</altitudeMode>\n'
-                          '\t\t\t<coordinates>\n')
-        section = ('\t\t\t\t{},{}\n')
-        section_footer  = ('\t\t\t</coordinates>\n'
-                           '\t\t</LineString>\n'
-                           '\t</Placemark>\n')
-        footer = ('</Document>\n'
-                   '</kml>\n')
-
-    # Regular expressions for parsing the CSV file.
-    # Note that the delimiter can be a tab, a comma, or whitespace.
-    decimal = '-?[0-9]+(.[0-9]+)?'
-    delimiter = '[\t,]'
-    line_validation = re.compile(decimal + delimiter + decimal)
-    splitter = re.compile(delimiter)
-
-    # Parse the input files and build the string containing the body of the KML
-    # document as we go.
-    for input_file in sys.argv[first_file_arg:-1]:
-        with open(input_file) as current_file:
-            for line_number, line in enumerate(current_file):
-                # If this is a new file, start a new section
-                if line_number == 1:
-                    body += section_footer
-
-                    # If the first line is not data, use it as the name of the
-                    # folder.
-                    if not line_validation.match(line):
-                        body += section_header + '<name>{}</name>\n'.format(line)
+    with Stats(options, input_files, [output]) as stats:
+        convert_files(input_files, output, kml_type, jobs, stats, cell_size,
+                tolerance)
+
+# Convert CSV files into one KML document. Each input file becomes a folder of
+# placemarks or a single path. With a cell_size, each folder has a placemark
+# for each cell of a grid instead of for each point. With a tolerance, each path
+# is simplified so that no point is left more than that far from it, and how
+# much smaller each path got is printed.
+def convert_files(input_files, output, kml_type, jobs, stats, cell_size=None,
+        tolerance=None):
+    # Find the name of each input file's section and split the rest of the
+    # file into chunks. With one job, each file is one chunk.
+    sections = []
+    with stats.stage('split'):
+        for input_file in input_files:
+            name, data_start = read_section_name(input_file)
+            # A compressed file can't be split, since each chunk would have
+            # to decompress everything before it.
+            if jobs == 1 or is_compressed(input_file):
+                chunks = [(data_start, None)]
+            else:
+                chunks = split_file(input_file, data_start)
+            sections.append((input_file, name, chunks))
+
+    # Parse the input files and write the KML document as we go. With more
+    # than one job, the chunks are converted in a pool of processes and the
+    # results are copied into the document in order.
+    with stats.stage('convert'), KMLWriter(output) as kml:
+        if jobs > 1:
+            if kml_type == 'placemark':
+                open_elements = kml.open_elements + ['Folder']
+            else:
+                open_elements = kml.open_elements + ['Placemark']
+            if cell_size is None:
+                tasks = [(input_file, start, end, kml_type, open_elements)
+                        for input_file, name, chunks in sections
+                        for start, end in chunks]
+                pieces = iter_pieces(write_chunk, tasks, jobs,
+                        os.path.dirname(os.path.abspath(output)))
+            else:
+                tasks = [(input_file, start, end, cell_size)
+                        for input_file, name, chunks in sections
+                        for start, end in chunks]
+                pieces = iter_results(aggregate_chunk, tasks, jobs)
+
+        for input_file, name, chunks in sections:
+            if kml_type == 'placemark':
+                kml.begin_folder(name)
+            else:
+                kml.begin_path(name)
+
+            cells = {}
+            simplifier = None
+            if tolerance is not None:
+                simplifier = PathSimplifier(tolerance)
+            for start, end in chunks:
+                if cell_size is not None:
+                    if jobs == 1:
+                        chunk_cells = aggregate_chunk((input_file, start, end,
+                            cell_size), stats)
                     else:
-                        body += section_header
-
-                elif line_validation.match(line):
-                    longitude = splitter.split(line.strip())[0]
-                    latitude = splitter.split(line.strip())[1]
-
-                    body = body + section.format(longitude, latitude)
-
-    # Write the resulting KML to a file.
-    with open(sys.argv[-1], 'w') as output_file:
-        output_file.write(header + body + footer)
+                        chunk_cells = next(pieces)
+                    merge_cells(cells, chunk_cells)
+                elif jobs == 1:
+                    convert_chunk(input_file, start, end, kml_type, kml,
+                            stats, simplifier)
+                else:
+                    copy_piece(next(pieces), kml.output_file)
+            if cell_size is not None:
+                write_cells(kml, cells)
+            if simplifier is not None:
+                print('{}: simplified {:,} points to {:,} ({:.1%} fewer)'.format(
+                    input_file, simplifier.points_read,
+                    simplifier.points_kept, simplifier.reduction()),
+                    file=sys.stderr)
+
+            if kml_type == 'placemark':
+                kml.end_folder()
+            else:
+                kml.end_path()
+
+# Split the part of a file after the offset start into (start, end) ranges of
+# about CHUNK_SIZE bytes each.
+def split_file(input_file, start):
+    size = os.path.getsize(input_file)
+    chunks = []
+    while start < size:
+        chunks.append((start, min(start + CHUNK_SIZE, size)))
+        start += CHUNK_SIZE
+    return chunks
+
+# Convert the lines of a file that start between the offsets start and end (or
+# the end of the file, if end is None) and write them with a KMLWriter. The
+# points that are written are counted in stats, if it is given. A path is
+# simplified with simplifier, if it is given.
+def convert_chunk(input_file, start, end, kml_type, kml, stats=None,
+        simplifier=None):
+    point_lists = iter_csv_point_lists(input_file, start, end)
+    if simplifier is not None:
+        point_lists = simplifier.simplify(point_lists)
+    for points in point_lists:
+        if stats is not None:
+            stats.add_rows(len(points))
+        if kml_type == 'placemark':
+            kml.write_placemarks(points)
+        else:
+            kml.write_path_points(points)
+
+# Convert one chunk of a file in a worker process, writing the result to
+# piece_file.
+def write_chunk(task, piece_file):
+    input_file, start, end, kml_type, open_elements = task
+    with KMLFragmentWriter(piece_file, open_elements) as kml:
+        convert_chunk(input_file, start, end, kml_type, kml)
+
+# Count the points of one chunk of a file in a grid, which can happen in a
+# worker process. The points are counted in stats, if it is given.
+def aggregate_chunk(task, stats=None):
+    input_file, start, end, cell_size = task
+    cells = {}
+    for points in iter_csv_point_lists(input_file, start, end):
+        if stats is not None:
+            stats.add_rows(len(points))
+        merge_cells(cells, aggregate_points(points, cell_size))
+    return cells
 
 def print_usage():
     print((
-            'Usage: {} [-t=TYPE] {{CSV_FILE}} OUTPUT\n'
-            'TYPE can be "placemark" or "path"'
-            ).format(sys.argv[0]), file=sys.stderr)
+            'Usage: {} [-t=TYPE] [-j=JOBS] [-g=CELL_SIZE] [-s=TOLERANCE] '
+            '[--stats] [--profile=FILE] {{CSV_FILE}} OUTPUT\n'
+            'TYPE can be "placemark" or "path"\n'
+            'JOBS is the number of processes to use (default 1)\n'
+            'With -g, the placemarks in each CELL_SIZE by CELL_SIZE degree cell '
+            'of a grid\nare combined into one placemark named for how many '
+            'there are\n'
+            'With -s, paths are simplified so that no point is more than '
+            'TOLERANCE degrees\nfrom them (-s can\'t be used with -j)\n'
+            'CSV files ending in .gz, .bz2 or .xz are decompressed as they are '
+            'read\n'
+            '{}'
+            ).format(sys.argv[0], STATS_USAGE), file=sys.stderr)
     exit()
 
 if __name__ == '__main__':
@@ -9,70 +9,85 @@
 
 import os.path
 import sys
-from xml.etree import ElementTree
+
+from kmlwriter import BUFFER_SIZE
+from options import parse_options, parse_jobs
+from parallel import iter_pieces, copy_piece
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
+from streams import iter_kml_points, write_delimited
 
 def main():
     if len(sys.argv) < 3:
         print_usage()
 
-    # Set the delimiter for the delimited text file based on the -d option
-    # first_file_arg is the argument where the first file should be found.
+    # Set the delimiter for the delimited text file based on the -d option and
+    # the number of processes to use based on the -j option.
     # The -d=, and -d , syntaxes are both acceptable
-    if sys.argv[1] == '-d':
-        delimiter = sys.argv[2]
-        first_file_arg = 3
-    elif sys.argv[1].startswith('-d=') and len(sys.argv[1]) == 4:
-        delimiter = sys.argv[1].split('=')[1]
-        first_file_arg = 2
-    else:
-        delimiter = '\t'
-        first_file_arg = 1
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                dict({'-d': '\t', '-j': '1'}, **STATS_OPTIONS),
+                {'--jobs': '-j'})
+        delimiter = options['-d']
+        jobs = parse_jobs(options['-j'])
+    except ValueError:
+        print_usage()
 
     # Make sure that the delimiter is a reasonable character
     if not delimiter in [',', '\t', ' ']:
         print_usage()
 
     # If there aren't enough file arguments, display the usage message and exit.
-    if len(sys.argv) < 2 + first_file_arg:
+    if len(file_args) < 2:
         print_usage()
+    input_files = file_args[:-1]
+    output = file_args[-1]
 
     # Check if the output file already exists
-    if os.path.exists(sys.argv[-1]):
-        user_response = input(sys.argv[-1] + ' already exists. Overwrite it? [y/N] ')
+    if os.path.exists(output):
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
         if user_response == '' or user_response[0] != 'y':
             exit()
 
-    # Parse each KML file and look for <coordinates> tags in each file.
-    coordinates = []
-    kmlns = {'kml' : 'http://www.opengis.net/kml/2.2'}
-    for input_file in sys.argv[first_file_arg:-1]:
-        kml = ElementTree.parse(input_file)
-        coordinates += kml.findall('.//kml:coordinates', namespaces = kmlns)
+    # Convert each KML file and write the result to the output file. With more
+    # than one job, the files are converted in a pool of processes and the
+    # results are copied into the output file in order.
+    with Stats(options, input_files, [output]) as stats, \
+            stats.stage('convert'), \
+            open(output, 'w', encoding='utf-8',
+                buffering=BUFFER_SIZE) as output_file:
+        if jobs == 1:
+            for input_file in input_files:
+                convert_file(input_file, delimiter, output_file, stats)
+        else:
+            tasks = [(input_file, delimiter) for input_file in input_files]
+            for piece_file in iter_pieces(write_file, tasks, jobs,
+                    os.path.dirname(os.path.abspath(output))):
+                copy_piece(piece_file, output_file)
 
-    # Write the coordinates to a file as delimited text
-    with open(sys.argv[-1], 'w') as output_file:
-        for coordinate in coordinates:
-            for coordinate_line in coordinate.text.strip().split('\n'):
-                split_coordinate = coordinate_line.strip().split(',')
-                output_string = ""
-                
-                if len(split_coordinate) >= 2:
-                    longitude = split_coordinate[0]
-                    latitude = split_coordinate[1]
-                    output_string += longitude + delimiter + latitude
-                if len(split_coordinate) >= 3:
-                    altitude = split_coordinate[2]
-                    output_string += delimiter + altitude
+# Parse a KML file and write the coordinates in each <coordinates> tag to an
+# open file as delimited text as soon as they have been read. The coordinates
+# are counted in stats, if it is given.
+def convert_file(input_file, delimiter, output_file, stats=None):
+    points = iter_kml_points(input_file)
+    if stats is not None:
+        points = stats.count_rows(points)
+    write_delimited(points, output_file, delimiter)
 
-                # Skip empty lines
-                if output_string != '':
-                    output_file.write(output_string + '\n')
+# Convert one KML file in a worker process, writing the result to piece_file.
+def write_file(task, piece_file):
+    input_file, delimiter = task
+    with open(piece_file, 'w', encoding='utf-8',
+            buffering=BUFFER_SIZE) as output_file:
+        convert_file(input_file, delimiter, output_file)
 
 def print_usage():
     print((
-        'Usage: {} [-d=DELIM_CHAR] {{KML_FILE}} OUTPUT\n'
-        'DELIM_CHAR can be a comma, tab, or space'
-        ).format(sys.argv[0]), file=sys.stderr)
+        'Usage: {} [-d=DELIM_CHAR] [-j=JOBS] [--stats] [--profile=FILE] '
+        '{{KML_FILE}} OUTPUT\n'
+        'DELIM_CHAR can be a comma, tab, or space\n'
+        'JOBS is the number of processes to use (default 1)\n'
+        '{}'
+        ).format(sys.argv[0], STATS_USAGE), file=sys.stderr)
     exit()
 
 if __name__ == '__main__':
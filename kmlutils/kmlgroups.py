@@ -0,0 +1,80 @@
+######################################################################
+# kmlgroups.py                                                       #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Write placemarks into one folder for each of their names, in one   #
+# pass over the placemarks, with a shared style for each folder.     #
+#                                                                    #
+######################################################################
+
+import colorsys
+import os
+import tempfile
+
+from kmltiles import spill_line, read_spill_line
+from kmlwriter import KMLWriter, BUFFER_SIZE
+
+# At most this many spill files are kept open at once. If there are more names
+# than this, the files that have been open the longest are closed and opened
+# again when they are needed.
+MAX_OPEN_FILES = 64
+
+# Write (longitude, latitude, name) points into a new KML document with a
+# Folder for each name, in order by name. The placemarks in each folder use a
+# Style of their own color that is defined once at the top of the document,
+# and each placemark keeps its name, like in a flat document. The points are
+# sorted into a temporary spill file for each name as they are read, so they
+# never have to fit in memory. Returns the number of points in each group.
+def write_groups(points, output):
+    output_directory = os.path.dirname(os.path.abspath(output))
+    with tempfile.TemporaryDirectory(dir=output_directory) as spill_directory:
+        spill_files = {}
+        open_files = {}
+        counts = {}
+        try:
+            for longitude, latitude, name in points:
+                name = str(name)
+                spill_file = open_files.get(name)
+                if spill_file is None:
+                    if len(open_files) >= MAX_OPEN_FILES:
+                        oldest = next(iter(open_files))
+                        open_files.pop(oldest).close()
+                    if name not in spill_files:
+                        spill_files[name] = os.path.join(spill_directory,
+                                str(len(spill_files)))
+                        counts[name] = 0
+                    spill_file = open_files[name] = open(spill_files[name],
+                            'a', encoding='utf-8', buffering=BUFFER_SIZE)
+                spill_file.write(spill_line(longitude, latitude, None))
+                counts[name] += 1
+        finally:
+            for spill_file in open_files.values():
+                spill_file.close()
+
+        names = sorted(spill_files)
+        # The style IDs are kept short, since every placemark repeats one.
+        style_ids = {name: 's{}'.format(number)
+                for number, name in enumerate(names)}
+        with KMLWriter(output) as kml:
+            for number, name in enumerate(names):
+                kml.write_style(style_ids[name],
+                        group_color(number, len(names)))
+            for name in names:
+                kml.begin_folder(name)
+                style_url = '#' + style_ids[name]
+                with open(spill_files[name], encoding='utf-8') as spill_file:
+                    for line in spill_file:
+                        longitude, latitude = read_spill_line(line)[:2]
+                        kml.write_placemark(longitude, latitude, name,
+                                style_url=style_url)
+                kml.end_folder()
+
+    return counts
+
+# The KML color (aabbggrr) of group number out of count, evenly spread around
+# the color wheel.
+def group_color(number, count):
+    red, green, blue = colorsys.hsv_to_rgb(number / max(count, 1), 0.85, 1.0)
+    return 'ff{:02x}{:02x}{:02x}'.format(round(blue * 255), round(green * 255),
+            round(red * 255))
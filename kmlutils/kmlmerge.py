@@ -9,52 +9,56 @@
 
 import os.path
 import sys
-from xml.etree import ElementTree
+
+from kmlreader import iter_features
+from kmlwriter import KMLWriter
+from options import parse_options
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
 
 def main():
     if len(sys.argv) < 3:
         print_usage()
 
+    try:
+        options, file_args = parse_options(sys.argv[1:], STATS_OPTIONS)
+    except ValueError:
+        print_usage()
+    if len(file_args) < 2:
+        print_usage()
+    input_files = file_args[:-1]
+    output = file_args[-1]
+
     # Check if the output file already exists
-    if os.path.exists(sys.argv[-1]):
-        user_response = input(sys.argv[-1] + ' already exists. Overwrite it? [y/N] ')
+    if os.path.exists(output):
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
         if user_response == '' or user_response[0] != 'y':
             exit()
 
-    # Parse each KML file to be merged
-    kml_document = ElementTree.ElementTree()
-    kml_document._setroot(ElementTree.Element('kml'))
-    root_folder = ElementTree.Element('Folder')
-    kml_document.getroot().append(root_folder)
-    for input_file in sys.argv[1:-1]:
-        for element in list(ElementTree.parse(input_file).getroot()):
-            root_folder.append(element)
-    
-    ElementTree.register_namespace('', 'http://www.opengis.net/kml/2.2')
-    kml_document.write(sys.argv[-1], encoding='utf-8', xml_declaration=True)
-#    # Write the merged KML to a file
-#    with open(sys.argv[-1], 'w') as output_file:
-#        for coordinate in elements:
-#            for coordinate_line in coordinate.text.strip().split('\n'):
-#                split_coordinate = coordinate_line.strip().split(',')
-#                output_string = ""
-#                
-#                if len(split_coordinate) >= 2:
-#                    longitude = split_coordinate[0]
-#                    latitude = split_coordinate[1]
-#                    output_string += longitude + delimiter + latitude
-#                if len(split_coordinate) >= 3:
-#                    altitude = split_coordinate[2]
-#                    output_string += delimiter + altitude
-#
-#                # Skip empty lines
-#                if output_string != '':
-#                    output_file.write(output_string + '\n')
+    # Copy the contents of each KML file into one folder in the output file,
+    # one feature at a time. Documents and folders are copied by writing their
+    # start and end tags as they are read, so that even a huge document never
+    # has to be held in memory.
+    with Stats(options, input_files, [output]) as stats, \
+            stats.stage('merge'), \
+            KMLWriter(output, container='Folder') as kml:
+        for input_file in input_files:
+            for event, element in stats.count_rows(iter_features(input_file)):
+                if event == 'start':
+                    kml.begin_element(local_name(element.tag), element.attrib)
+                elif event == 'end':
+                    kml.end_element(local_name(element.tag))
+                else:
+                    kml.write_element(element)
+
+# Remove the namespace from a tag in ElementTree's {namespace}tag form.
+def local_name(tag):
+    return tag.rpartition('}')[2]
 
 def print_usage():
     print((
-        'Usage: {} {{KML_FILES}} OUTPUT'
-        ).format(sys.argv[0]), file=sys.stderr)
+        'Usage: {} [--stats] [--profile=FILE] {{KML_FILES}} OUTPUT\n'
+        '{}'
+        ).format(sys.argv[0], STATS_USAGE), file=sys.stderr)
     exit()
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+######################################################################
+# kmlquery.py                                                        #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Find the Point placemarks in a KML file that are inside of a       #
+# bounding box or within some distance of a point, using a grid      #
+# index saved next to the KML file.                                  #
+#                                                                    #
+######################################################################
+
+import math
+import os.path
+import sys
+
+from kmlwriter import KMLWriter, BUFFER_SIZE
+from options import parse_options
+from spatialindex import GridIndex
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
+
+def main():
+    if len(sys.argv) < 4:
+        print_usage()
+
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                dict({'-b': None, '-r': None, '-f': 'kml', '-c': None,
+                    '-d': ','}, **STATS_OPTIONS),
+                {'--bbox': '-b', '--radius': '-r', '--format': '-f',
+                    '--cell-size': '-c'})
+        bbox = parse_numbers(options['-b'], 4)
+        radius = parse_numbers(options['-r'], 3)
+        if options['-c'] is None:
+            cell_size = None
+        else:
+            cell_size = float(options['-c'])
+            if not math.isfinite(cell_size) or cell_size <= 0:
+                raise ValueError('the grid cells must have a size')
+    except ValueError:
+        print_usage()
+
+    # Exactly one kind of query has to be given.
+    if (bbox is None) == (radius is None):
+        print_usage()
+    if not options['-f'] in ['kml', 'csv']:
+        print_usage()
+    if not options['-d'] in [',', '\t', ' ']:
+        print_usage()
+    if len(file_args) != 2:
+        print_usage()
+    kml_file, output = file_args
+
+    # Check if the output file already exists
+    if os.path.exists(output):
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
+        if user_response == '' or user_response[0] != 'y':
+            exit()
+
+    with Stats(options, [kml_file], [output]) as stats:
+        with stats.stage('index'):
+            index = GridIndex(kml_file, cell_size)
+        with index:
+            with stats.stage('query'):
+                if bbox is not None:
+                    points = index.query_bbox(*bbox)
+                else:
+                    points = index.query_radius(*radius)
+            stats.add_rows(len(points))
+
+            with stats.stage('write'):
+                if options['-f'] == 'kml':
+                    write_kml(index, points, output)
+                else:
+                    write_csv(points, options['-d'], output)
+
+# Parse a comma separated list of count numbers, or return None if there isn't
+# one.
+def parse_numbers(value, count):
+    if value is None:
+        return None
+    numbers = [float(number) for number in value.split(',')]
+    if len(numbers) != count:
+        raise ValueError('expected {} numbers'.format(count))
+    return numbers
+
+# Copy the placemarks that were found from the index into a new document, in
+# the order they appear in the KML file.
+def write_kml(index, points, output):
+    with KMLWriter(output) as kml:
+        for longitude, latitude, offset, length in points:
+            kml.write_fragment(index.placemark_text(offset, length))
+
+def write_csv(points, delimiter, output):
+    with open(output, 'w', buffering=BUFFER_SIZE) as output_file:
+        for longitude, latitude, offset, length in points:
+            output_file.write('{!r}{}{!r}\n'.format(longitude, delimiter,
+                latitude))
+
+def print_usage():
+    print((
+        'Usage: {} -b=WEST,SOUTH,EAST,NORTH [-f=FORMAT] [-c=CELL_SIZE] '
+        'KML_FILE OUTPUT\n'
+        '       {} -r=LONGITUDE,LATITUDE,KILOMETERS [-f=FORMAT] '
+        '[-c=CELL_SIZE] KML_FILE OUTPUT\n'
+        'FORMAT can be "kml" or "csv"\n'
+        'CELL_SIZE is the size of the index grid in degrees (default 1)\n'
+        'The CSV delimiter can be set with -d like kml2csv.py\n'
+        'Both forms also take [--stats] [--profile=FILE]: {}'
+        ).format(sys.argv[0], sys.argv[0], STATS_USAGE), file=sys.stderr)
+    exit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+######################################################################
+# kmlreader.py                                                       #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Read a KML file incrementally, so that only the elements that are  #
+# being worked on are held in memory.                                #
+#                                                                    #
+######################################################################
+
+import zipfile
+from xml.etree import ElementTree
+
+from kmlwriter import KML_NAMESPACE, KMZ_DOCUMENT
+
+# Open a KML file for reading as binary. If the file is a KMZ archive, its
+# document is decompressed as it is read. The document is doc.kml if there is
+# one, or else the first .kml file in the archive.
+def open_kml_input(input_file):
+    if not zipfile.is_zipfile(input_file):
+        return open(input_file, 'rb')
+
+    with zipfile.ZipFile(input_file) as archive:
+        names = archive.namelist()
+        kml_names = [name for name in names if name.lower().endswith('.kml')]
+        if KMZ_DOCUMENT in names:
+            return archive.open(KMZ_DOCUMENT)
+        if kml_names:
+            return archive.open(kml_names[0])
+    raise ValueError('{} does not contain a KML document'.format(input_file))
+
+# Parse a KML file and yield each element whose tag is in tags as soon as its
+# end tag has been read. Elements are removed from the tree once they are
+# finished with, so the only elements kept in memory are the ones that are
+# still open and the ones inside of an element that is going to be yielded.
+# Tags are given in ElementTree's {namespace}tag form.
+def iter_elements(input_file, tags):
+    open_elements = []
+    open_wanted_elements = 0
+    with open_kml_input(input_file) as kml:
+        for event, element in ElementTree.iterparse(kml,
+                events=('start', 'end')):
+            if event == 'start':
+                open_elements.append(element)
+                if element.tag in tags:
+                    open_wanted_elements += 1
+                continue
+
+            open_elements.pop()
+            if element.tag in tags:
+                open_wanted_elements -= 1
+                yield element
+
+            if open_elements and open_wanted_elements == 0:
+                open_elements[-1].remove(element)
+
+# Elements that hold features and are copied a piece at a time by
+# iter_features, rather than as a whole.
+CONTAINER_TAGS = {'{{{}}}{}'.format(KML_NAMESPACE, tag)
+        for tag in ['Document', 'Folder']}
+
+# Parse a KML file and yield the contents of its root element one piece at a
+# time as (event, element) pairs. Documents and Folders that are not inside of
+# some other feature are yielded twice, as a 'start' event when their start tag
+# is read and an 'end' event when their end tag is read. Everything else inside
+# of them, and inside of the root element, is yielded whole as a 'feature'
+# event. Each of these is removed from the tree after it is yielded, so only
+# one feature is held in memory at a time.
+def iter_features(input_file):
+    # For each open element, whether it is being streamed as start and end
+    # events rather than kept as part of a feature.
+    open_elements = []
+    with open_kml_input(input_file) as kml:
+        for event, element in ElementTree.iterparse(kml,
+                events=('start', 'end')):
+            if event == 'start':
+                if not open_elements:
+                    open_elements.append((element, True))
+                elif open_elements[-1][1] and element.tag in CONTAINER_TAGS:
+                    open_elements.append((element, True))
+                    yield 'start', element
+                else:
+                    open_elements.append((element, False))
+                continue
+
+            element, streamed = open_elements.pop()
+            if not open_elements:
+                continue
+            parent, parent_streamed = open_elements[-1]
+            if streamed:
+                yield 'end', element
+            elif parent_streamed:
+                yield 'feature', element
+
+            if parent_streamed:
+                parent.remove(element)
+
+# Yield the text of every <coordinates> element in a KML file.
+def iter_coordinates(input_file):
+    coordinates_tag = '{{{}}}coordinates'.format(KML_NAMESPACE)
+    for element in iter_elements(input_file, {coordinates_tag}):
+        yield element.text or ''
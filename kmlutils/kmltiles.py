@@ -0,0 +1,163 @@
+######################################################################
+# kmltiles.py                                                        #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Split a large set of placemarks into a quadtree of KML files that  #
+# are tied together with NetworkLinks and Regions, so that Google    #
+# Earth only loads the tiles that are in view.                       #
+#                                                                    #
+######################################################################
+
+import math
+import os
+import re
+import tempfile
+
+from kmlwriter import KMLWriter
+
+# Tiles hold at most this many placemarks, unless some other number is asked
+# for.
+DEFAULT_TILE_SIZE = 1000
+
+# Tiles this many levels below the root hold all of the points in their area,
+# however many there are. Otherwise points that share one location would be
+# split up forever.
+MAX_DEPTH = 16
+
+# The names of the files of the tiles below the root, which are made of the
+# quadrant numbers of the path to the tile.
+tile_file_name = re.compile(r'[0-3]+\.km[lz]$', re.IGNORECASE)
+
+# A child tile is loaded once its region takes up this many pixels on the
+# screen.
+MIN_LOD_PIXELS = 256
+
+# Write (longitude, latitude, name) points as a quadtree of tiles. The root
+# tile is written to output and the rest of the tiles are written to a
+# directory next to it. Each tile shows up to tile_size
+# of the points in its area, spread out evenly, and links to four child tiles
+# that split up the rest of the points in its area. The tiles are KMZ archives
+# if output is one. The points are kept in temporary files while the tree is
+# built, so they never have to fit in memory. Tiles left in the directory by an
+# earlier run are deleted first. Points whose coordinates aren't finite numbers
+# are skipped. Returns the name of the directory and the number of points that
+# were skipped.
+def write_tiles(points, output, tile_size=DEFAULT_TILE_SIZE):
+    base_name, extension = os.path.splitext(output)
+    tile_directory = base_name + '_tiles'
+    os.makedirs(tile_directory, exist_ok=True)
+    for name in os.listdir(tile_directory):
+        if tile_file_name.match(name):
+            os.remove(os.path.join(tile_directory, name))
+
+    with tempfile.TemporaryDirectory(dir=tile_directory) as spill_directory:
+        # Write all of the points to the root's spill file and find the area
+        # that they cover.
+        root_spill = os.path.join(spill_directory, 'root')
+        count = 0
+        skipped = 0
+        west = south = float('inf')
+        east = north = float('-inf')
+        with open(root_spill, 'w', encoding='utf-8') as spill_file:
+            for longitude, latitude, name in points:
+                try:
+                    x = float(longitude)
+                    y = float(latitude)
+                    if not (math.isfinite(x) and math.isfinite(y)):
+                        skipped += 1
+                        continue
+                except ValueError:
+                    skipped += 1
+                    continue
+                west = min(west, x)
+                east = max(east, x)
+                south = min(south, y)
+                north = max(north, y)
+                spill_file.write(spill_line(longitude, latitude, name))
+                count += 1
+
+        if count == 0:
+            west = south = east = north = 0.0
+
+        # Build the tree one tile at a time.
+        pending = [(output, root_spill, count, (west, south, east, north), '')]
+        while pending:
+            tile_file, tile_spill, count, bbox, tile_id = pending.pop()
+            pending += write_tile(tile_file, tile_spill, count, bbox, tile_id,
+                    tile_size, tile_directory, spill_directory, extension,
+                    tile_file == output)
+            os.remove(tile_spill)
+
+    return tile_directory, skipped
+
+# Write one tile and the spill files for its children. Returns the pending work
+# for the children: their tile file, spill file, number of points, bounding box
+# and ID.
+def write_tile(tile_file, tile_spill, count, bbox, tile_id, tile_size,
+        tile_directory, spill_directory, extension, is_root):
+    west, south, east, north = bbox
+    middle_longitude = (west + east) / 2
+    middle_latitude = (south + north) / 2
+    child_boxes = [(west, middle_latitude, middle_longitude, north),
+                   (middle_longitude, middle_latitude, east, north),
+                   (west, south, middle_longitude, middle_latitude),
+                   (middle_longitude, south, east, middle_latitude)]
+
+    children = []
+    with KMLWriter(tile_file) as kml, open(tile_spill,
+            encoding='utf-8') as spill_file:
+        if count <= tile_size or len(tile_id) >= MAX_DEPTH:
+            for line in spill_file:
+                kml.write_placemark(*read_spill_line(line))
+            return []
+
+        # Keep an even sample of tile_size points in this tile and split the
+        # rest between the four children by quadrant.
+        child_spills = [os.path.join(spill_directory, tile_id + str(quadrant))
+                for quadrant in range(4)]
+        child_counts = [0, 0, 0, 0]
+        child_files = [open(child_spill, 'w', encoding='utf-8')
+                for child_spill in child_spills]
+        try:
+            kml.begin_folder()
+            for point_number, line in enumerate(spill_file):
+                if (point_number * tile_size // count !=
+                        (point_number + 1) * tile_size // count):
+                    kml.write_placemark(*read_spill_line(line))
+                    continue
+
+                longitude, latitude, name = read_spill_line(line)
+                quadrant = ((float(latitude) < middle_latitude) * 2 +
+                        (float(longitude) >= middle_longitude))
+                child_files[quadrant].write(line)
+                child_counts[quadrant] += 1
+            kml.end_folder()
+        finally:
+            for child_file in child_files:
+                child_file.close()
+
+        for quadrant in range(4):
+            if child_counts[quadrant] == 0:
+                os.remove(child_spills[quadrant])
+                continue
+
+            child_id = tile_id + str(quadrant)
+            child_file = os.path.join(tile_directory, child_id + extension)
+            href = child_id + extension
+            if is_root:
+                href = os.path.basename(tile_directory) + '/' + href
+            kml.write_network_link(href, child_boxes[quadrant], MIN_LOD_PIXELS)
+            children.append((child_file, child_spills[quadrant],
+                child_counts[quadrant], child_boxes[quadrant], child_id))
+
+    return children
+
+# Points are kept in the spill files as tab separated lines.
+def spill_line(longitude, latitude, name):
+    return '{}\t{}\t{}\n'.format(longitude, latitude, '' if name is None else
+            name.replace('\t', ' ').replace('\n', ' '))
+
+def read_spill_line(line):
+    longitude, latitude, name = line.rstrip('\n').split('\t')
+    return longitude, latitude, name
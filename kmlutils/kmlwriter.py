@@ -0,0 +1,373 @@
+######################################################################
+# kmlwriter.py                                                       #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Write a KML document to a file one piece at a time, so that the    #
+# whole document never has to be held in memory.                     #
+#                                                                    #
+######################################################################
+
+import io
+import os
+import time
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+KML_NAMESPACE = 'http://www.opengis.net/kml/2.2'
+KML_TAG_PREFIX = '{{{}}}'.format(KML_NAMESPACE)
+
+# Namespaces that are commonly used in KML files, so that elements copied from
+# other files keep their usual prefixes.
+ElementTree.register_namespace('', KML_NAMESPACE)
+ElementTree.register_namespace('gx', 'http://www.google.com/kml/ext/2.2')
+ElementTree.register_namespace('atom', 'http://www.w3.org/2005/Atom')
+
+# Output is buffered in blocks of this many bytes.
+BUFFER_SIZE = 1024 * 1024
+
+# The name of the KML document inside of a KMZ archive.
+KMZ_DOCUMENT = 'doc.kml'
+
+def is_kmz(file_name):
+    return file_name.lower().endswith('.kmz')
+
+# Open a file to write KML text to. If the file name ends in .kmz, the KML is
+# compressed into a KMZ archive as it is written.
+def open_kml_output(output_file):
+    if is_kmz(output_file):
+        return KMZWriter(output_file)
+    return open(output_file, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+# A text file that compresses everything written to it into the document of a
+# KMZ archive. Closing it finishes the archive.
+class KMZWriter(io.TextIOWrapper):
+    def __init__(self, output_file):
+        self.archive = zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED)
+        document_info = zipfile.ZipInfo(KMZ_DOCUMENT, time.localtime()[:6])
+        document_info.compress_type = zipfile.ZIP_DEFLATED
+        document = self.archive.open(document_info, 'w', force_zip64=True)
+        super().__init__(io.BufferedWriter(document, BUFFER_SIZE),
+                encoding='utf-8')
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.archive.close()
+
+class KMLWriter:
+    # Start a KML document in output_file. Everything in the document goes
+    # inside of one container element, usually a Document or a Folder. If the
+    # file name ends in .kmz, the document is written as a KMZ archive.
+    # output_file can also be a text file that is already open, such as a
+    # StringIO, which is left open when the document is finished.
+    def __init__(self, output_file, container='Document'):
+        if isinstance(output_file, str):
+            self.output_name = output_file
+            self.output_file = open_kml_output(output_file)
+            self.owns_file = True
+        else:
+            self.output_file = output_file
+            self.owns_file = False
+        self.finished = False
+        self.open_elements = [container]
+        self.output_file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                               '<kml xmlns="{}">\n'
+                               '<{}>\n'.format(KML_NAMESPACE, container))
+
+    def __enter__(self):
+        return self
+
+    # If the document is left because of an exception, it is abandoned rather
+    # than finished.
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # The indentation for the next element written.
+    def indent(self):
+        return '\t' * len(self.open_elements)
+
+    # Start an element that other elements will be written inside of, such as
+    # a Folder. It is finished with end_element.
+    def begin_element(self, tag, attributes={}):
+        self.output_file.write('{}<{}{}>\n'.format(self.indent(), tag,
+                ''.join(' {}={}'.format(key, quoteattr(value))
+                    for key, value in attributes.items())))
+        self.open_elements.append(tag)
+
+    def begin_folder(self, name=None):
+        self.begin_element('Folder')
+        if name:
+            self.write_name(name)
+
+    def end_folder(self):
+        self.end_element('Folder')
+
+    def write_name(self, name):
+        self.output_file.write('{}<name>{}</name>\n'.format(self.indent(),
+                escape(name)))
+
+    # Write a Placemark containing a Point. The coordinates are written as
+    # they are given, so they can be strings straight out of an input file.
+    # style_url is the URL of a shared Style, like '#hail'.
+    def write_placemark(self, longitude, latitude, name=None, description=None,
+            style_url=None):
+        indent = self.indent()
+        self.output_file.write(indent + '<Placemark>\n')
+        if name is not None:
+            self.output_file.write('{}\t<name>{}</name>\n'.format(indent,
+                escape(name)))
+        if description is not None:
+            self.output_file.write('{}\t<description>{}</description>\n'.format(
+                indent, escape(description)))
+        if style_url is not None:
+            self.output_file.write('{}\t<styleUrl>{}</styleUrl>\n'.format(
+                indent, escape(style_url)))
+        self.output_file.write(('{0}\t<Point>\n'
+                                '{0}\t\t<coordinates>{1},{2}</coordinates>\n'
+                                '{0}\t</Point>\n'
+                                '{0}</Placemark>\n'
+                                ).format(indent, longitude, latitude))
+
+    # Write a Placemark containing a Point for each (longitude, latitude) pair
+    # in a list, all at once.
+    def write_placemarks(self, points):
+        template = ('{0}<Placemark>\n'
+                    '{0}\t<Point>\n'
+                    '{0}\t\t<coordinates>%s,%s</coordinates>\n'
+                    '{0}\t</Point>\n'
+                    '{0}</Placemark>\n').format(self.indent())
+        self.output_file.write(''.join([template % point for point in points]))
+
+    # Start a Placemark containing a LineString. The coordinates of the path
+    # are written with write_path_points and the path is finished with
+    # end_path.
+    def begin_path(self, name=None):
+        indent = self.indent()
+        self.output_file.write(indent + '<Placemark>\n')
+        if name:
+            self.output_file.write('{}\t<name>{}</name>\n'.format(indent,
+                escape(name)))
+        self.output_file.write(('{0}\t<LineString>\n'
+                                '{0}\t\t<extrude>0</extrude>\n'
+                                '{0}\t\t<tessellate>1</tessellate>\n'
+                                '{0}\t\t<altitudeMode>clampToGround</altitudeMode>\n'
+                                '{0}\t\t<coordinates>\n').format(indent))
+        self.open_elements.append('Placemark')
+
+    # Write the coordinates of a path for each (longitude, latitude) pair in a
+    # list, all at once.
+    def write_path_points(self, points):
+        template = '{}\t\t%s,%s\n'.format(self.indent())
+        self.output_file.write(''.join([template % point for point in points]))
+
+    def end_path(self):
+        self.open_elements.pop()
+        self.output_file.write(('{0}\t\t</coordinates>\n'
+                                '{0}\t</LineString>\n'
+                                '{0}</Placemark>\n').format(self.indent()))
+
+    # Write an element that was read from another KML file with ElementTree,
+    # including everything inside of it.
+    def write_element(self, element):
+        parts = [self.indent()]
+        serialize_element(element, parts)
+        parts.append('\n')
+        self.output_file.write(''.join(parts))
+
+    # Write a Style that placemarks can share by its ID, with an icon in a KML
+    # color (aabbggrr) and, if it is given, text for the placemarks' balloons.
+    def write_style(self, style_id, color, balloon_text=None,
+            icon_href='http://maps.google.com/mapfiles/kml/paddle/wht-blank.png'):
+        indent = self.indent()
+        self.output_file.write(('{0}<Style id={1}>\n'
+                                '{0}\t<IconStyle>\n'
+                                '{0}\t\t<color>{2}</color>\n'
+                                '{0}\t\t<Icon>\n'
+                                '{0}\t\t\t<href>{3}</href>\n'
+                                '{0}\t\t</Icon>\n'
+                                '{0}\t</IconStyle>\n').format(indent,
+                                    quoteattr(style_id), color,
+                                    escape(icon_href)))
+        if balloon_text is not None:
+            self.output_file.write(('{0}\t<BalloonStyle>\n'
+                                    '{0}\t\t<text>{1}</text>\n'
+                                    '{0}\t</BalloonStyle>\n').format(indent,
+                                        escape(balloon_text)))
+        self.output_file.write(indent + '</Style>\n')
+
+    # Write a NetworkLink to another KML file that is loaded once the region
+    # in bbox (west, south, east, north) takes up min_lod_pixels on the screen.
+    def write_network_link(self, href, bbox, min_lod_pixels):
+        west, south, east, north = bbox
+        self.output_file.write(('{0}<NetworkLink>\n'
+                                '{0}\t<Region>\n'
+                                '{0}\t\t<LatLonAltBox>\n'
+                                '{0}\t\t\t<north>{4!r}</north>\n'
+                                '{0}\t\t\t<south>{2!r}</south>\n'
+                                '{0}\t\t\t<east>{3!r}</east>\n'
+                                '{0}\t\t\t<west>{1!r}</west>\n'
+                                '{0}\t\t</LatLonAltBox>\n'
+                                '{0}\t\t<Lod>\n'
+                                '{0}\t\t\t<minLodPixels>{5}</minLodPixels>\n'
+                                '{0}\t\t\t<maxLodPixels>-1</maxLodPixels>\n'
+                                '{0}\t\t</Lod>\n'
+                                '{0}\t</Region>\n'
+                                '{0}\t<Link>\n'
+                                '{0}\t\t<href>{6}</href>\n'
+                                '{0}\t\t<viewRefreshMode>onRegion</viewRefreshMode>\n'
+                                '{0}\t</Link>\n'
+                                '{0}</NetworkLink>\n').format(self.indent(),
+                                    west, south, east, north, min_lod_pixels,
+                                    escape(href)))
+
+    # Write a piece of KML that is already text, such as a Placemark copied
+    # straight out of another KML file.
+    def write_fragment(self, text):
+        self.output_file.write(self.indent() + text + '\n')
+
+    def end_element(self, tag):
+        self.open_elements.pop()
+        self.output_file.write('{}</{}>\n'.format(self.indent(), tag))
+
+    # Close the elements that were opened after the first depth elements.
+    def end_elements(self, depth):
+        while len(self.open_elements) > depth:
+            if self.open_elements[-1] == 'Placemark':
+                self.end_path()
+            else:
+                self.end_element(self.open_elements[-1])
+
+    # Close any elements that are still open, finish the document and close
+    # the file.
+    def close(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.end_elements(0)
+        self.output_file.write('</kml>\n')
+        if self.owns_file:
+            self.output_file.close()
+
+    # Stop writing without finishing the document, and delete the output file
+    # if the writer opened it, so that a conversion that fails partway never
+    # leaves behind a document that looks whole but is missing placemarks.
+    def abort(self):
+        if self.finished:
+            return
+        self.finished = True
+        if self.owns_file:
+            self.output_file.close()
+            os.remove(self.output_name)
+
+# Add to a KML document that a KMLWriter has already finished. The closing tags
+# of the elements in open_elements, which have to start at footer_offset, are
+# cut off and written again when the appender is closed. A FooterError is
+# raised if the document doesn't end that way. If the appender is abandoned
+# because of an exception, the document is cut back to what it was before.
+class KMLAppender(KMLWriter):
+    def __init__(self, output_file, footer_offset, open_elements):
+        with open(output_file, 'r+b') as document:
+            document.seek(footer_offset)
+            if document.read() != closing_tags(open_elements).encode():
+                raise FooterError('{} does not end at offset {}'.format(
+                    output_file, footer_offset))
+            document.truncate(footer_offset)
+
+        self.output_name = output_file
+        self.output_file = open(output_file, 'a', encoding='utf-8',
+                buffering=BUFFER_SIZE)
+        self.owns_file = True
+        self.finished = False
+        self.open_elements = list(open_elements)
+        self.footer_offset = footer_offset
+        self.footer = closing_tags(open_elements)
+
+    # Throw away what was appended and put the closing tags back, rather than
+    # deleting the document.
+    def abort(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.output_file.close()
+        os.truncate(self.output_name, self.footer_offset)
+        with open(self.output_name, 'a', encoding='utf-8') as document:
+            document.write(self.footer)
+
+# Raised when a file that is to be added to doesn't end the way that it was
+# left by the last run that wrote it.
+class FooterError(ValueError):
+    pass
+
+# The text that a KMLWriter finishes its document with when the elements in
+# open_elements are still open.
+def closing_tags(open_elements):
+    return ''.join('{}</{}>\n'.format('\t' * depth, tag)
+            for depth, tag in reversed(list(enumerate(open_elements)))) + \
+            '</kml>\n'
+
+# Write part of a KML document to a file, to be copied into a document that is
+# being written by a KMLWriter later. This is used when a conversion is split
+# up between processes. The part is indented as if it were inside of the
+# elements in open_elements. Like for KMLWriter, output_file can also be a text
+# file that is already open, such as a StringIO, which is left open.
+class KMLFragmentWriter(KMLWriter):
+    def __init__(self, output_file, open_elements):
+        if isinstance(output_file, str):
+            self.output_name = output_file
+            self.output_file = open(output_file, 'w', encoding='utf-8',
+                    buffering=BUFFER_SIZE)
+            self.owns_file = True
+        else:
+            self.output_file = output_file
+            self.owns_file = False
+        self.finished = False
+        self.open_elements = list(open_elements)
+        self.depth = len(open_elements)
+
+    # Close any elements that were opened in this part and close the file.
+    def close(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.end_elements(self.depth)
+        if self.owns_file:
+            self.output_file.close()
+
+# Add the text of an element read with ElementTree, not including its tail, to
+# a list of strings. Elements in the KML namespace are written without a
+# prefix, because the namespace is already declared on the root of the
+# document. Anything else, including elements with namespaced attributes, is
+# left to ElementTree so that it gets the namespace
+# declarations it needs.
+def serialize_element(element, parts):
+    if (not element.tag.startswith(KML_TAG_PREFIX) or
+            any(key.startswith('{') for key in element.attrib)):
+        tail = element.tail
+        element.tail = None
+        parts.append(ElementTree.tostring(element, encoding='unicode').replace(
+                ' xmlns="{}"'.format(KML_NAMESPACE), '', 1))
+        element.tail = tail
+        return
+
+    tag = element.tag[len(KML_TAG_PREFIX):]
+    parts.append('<' + tag)
+    for key, value in element.attrib.items():
+        parts.append(' {}={}'.format(key, quoteattr(value)))
+
+    if element.text is None and len(element) == 0:
+        parts.append(' />')
+        return
+
+    parts.append('>')
+    if element.text:
+        parts.append(escape(element.text))
+    for child in element:
+        serialize_element(child, parts)
+        if child.tail:
+            parts.append(escape(child.tail))
+    parts.append('</{}>'.format(tag))
@@ -0,0 +1,48 @@
+######################################################################
+# options.py                                                         #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Parse the options given to the command line scripts.               #
+#                                                                    #
+######################################################################
+
+# Split the options at the start of a list of command line arguments from the
+# file arguments that follow them. defaults maps the name of each option (like
+# '-t') to its default value, and aliases maps other names for an option (like
+# '--type') to its name. An option's value can be given as "-t path" or as
+# "-t=path". An option whose default is False is a flag that doesn't take a
+# value, and is True if it is given. A dictionary of the values of all of the
+# options and a list of the remaining arguments are returned. ValueError is
+# raised if an option isn't known or is missing its value.
+def parse_options(arguments, defaults, aliases={}):
+    values = dict(defaults)
+    arguments = list(arguments)
+
+    while arguments and arguments[0].startswith('-') and arguments[0] != '-':
+        name, equals, value = arguments.pop(0).partition('=')
+        name = aliases.get(name, name)
+        if name not in values:
+            raise ValueError('unknown option ' + name)
+
+        if defaults[name] is False:
+            if equals:
+                raise ValueError('option {} does not take a value'.format(name))
+            values[name] = True
+            continue
+
+        if not equals:
+            if not arguments:
+                raise ValueError('missing value for option ' + name)
+            value = arguments.pop(0)
+
+        values[name] = value
+
+    return values, arguments
+
+# Get the number of processes from the value of a -j option.
+def parse_jobs(value):
+    jobs = int(value)
+    if jobs < 1:
+        raise ValueError('the number of jobs must be at least 1')
+    return jobs
@@ -0,0 +1,131 @@
+######################################################################
+# parallel.py                                                        #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Split a conversion up between a pool of processes and put the      #
+# pieces back together in order.                                     #
+#                                                                    #
+######################################################################
+
+import collections
+import itertools
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# A background thread gets at most this many items ahead of the caller.
+QUEUE_SIZE = 16
+
+# Run function(task, piece_file) for each task in a pool of processes. Each call
+# writes its piece of the output to the file named piece_file. The names of the
+# piece files are yielded in the same order as the tasks, however the work
+# happens to finish, so the pieces can be put together in a deterministic
+# order. Each piece file is deleted once the caller asks for the next one. The
+# piece files are kept in a temporary directory inside of directory.
+def iter_pieces(function, tasks, jobs, directory=None):
+    for piece_file, result in iter_piece_results(function, tasks, jobs,
+            directory):
+        yield piece_file
+
+# Like iter_pieces, but yield the name of each piece file along with what the
+# function returned for it. At most jobs tasks run at once.
+def iter_piece_results(function, tasks, jobs, directory=None):
+    with tempfile.TemporaryDirectory(dir=directory) as piece_directory, \
+            ProcessPoolExecutor(jobs) as pool:
+        futures = []
+        for task_number, task in enumerate(tasks):
+            piece_file = os.path.join(piece_directory, str(task_number))
+            futures.append((pool.submit(function, task, piece_file),
+                piece_file))
+
+        try:
+            for future, piece_file in futures:
+                result = future.result()
+                yield piece_file, result
+                if os.path.exists(piece_file):
+                    os.remove(piece_file)
+        finally:
+            for future, piece_file in futures:
+                future.cancel()
+
+# Run function(task) for each task in a pool of processes and yield the results
+# in the same order as the tasks. The tasks are taken from their iterable as the
+# results are used, so that at most twice as many as there are jobs are waiting
+# to be used at any time, and tasks can be read from a file that doesn't fit in
+# memory. initializer(*initargs) is called in each process when it starts, like
+# for ProcessPoolExecutor.
+def iter_results(function, tasks, jobs, initializer=None, initargs=()):
+    with ProcessPoolExecutor(jobs, initializer=initializer,
+            initargs=initargs) as pool:
+        futures = collections.deque()
+        try:
+            for task in tasks:
+                futures.append(pool.submit(function, task))
+                if len(futures) >= 2 * jobs:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+# Split the items of an iterable into lists of size items each, except for the
+# last one.
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# Yield the items of an iterable, which are taken from it by a background thread
+# ahead of the caller, so that reading a file can happen while the caller is
+# waiting on something else. An error from the iterable is raised in the
+# caller.
+def iter_in_thread(iterable, queue_size=QUEUE_SIZE):
+    items = queue.Queue(queue_size)
+    stopping = threading.Event()
+    finished = object()
+
+    # Put an item in the queue, giving up if the caller has stopped.
+    def put(item):
+        while not stopping.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read():
+        try:
+            for item in iterable:
+                if stopping.is_set():
+                    return
+                put((item, None))
+            put((finished, None))
+        except Exception as error:
+            put((finished, error))
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is finished:
+                return
+            yield item
+    finally:
+        stopping.set()
+        thread.join()
+
+# Copy the contents of a piece file to the end of an open text file.
+def copy_piece(piece_file, output_file):
+    with open(piece_file, encoding='utf-8') as piece:
+        shutil.copyfileobj(piece, output_file, 1024 * 1024)
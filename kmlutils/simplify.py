@@ -0,0 +1,145 @@
+######################################################################
+# simplify.py                                                        #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Simplify a path with the Douglas-Peucker algorithm as its points   #
+# are read, so that a path with millions of points can be drawn      #
+# with a small fraction of them.                                     #
+#                                                                    #
+######################################################################
+
+# Paths are simplified in windows of this many points. The last point that is
+# kept in each window is the first point of the next one.
+WINDOW_SIZE = 100000
+
+class PathSimplifier:
+    # Every point that is left out of a path is within tolerance (in the units
+    # of the coordinates, usually degrees) of the simplified path.
+    def __init__(self, tolerance, window_size=WINDOW_SIZE):
+        self.tolerance = tolerance
+        self.window_size = window_size
+        self.points_read = 0
+        self.points_kept = 0
+
+    # Simplify a path that is given as lists of (longitude, latitude) points,
+    # such as the lists that are read from each block of a CSV file. Yields
+    # lists of the points that are kept, as they were given. Points whose
+    # coordinates aren't numbers are left out.
+    def simplify(self, point_lists):
+        window = []
+        coordinates = []
+        for points in point_lists:
+            self.points_read += len(points)
+            for point in points:
+                try:
+                    coordinates.append((float(point[0]), float(point[1])))
+                except ValueError:
+                    continue
+                window.append(point)
+
+            if len(window) >= self.window_size:
+                kept = douglas_peucker(coordinates, self.tolerance)
+                # The last point is kept for the next window.
+                kept.pop()
+                self.points_kept += len(kept)
+                yield [window[index] for index in kept]
+                window = window[-1:]
+                coordinates = coordinates[-1:]
+
+        if window:
+            kept = douglas_peucker(coordinates, self.tolerance)
+            self.points_kept += len(kept)
+            yield [window[index] for index in kept]
+
+    # The fraction of the points that were left out.
+    def reduction(self):
+        if self.points_read == 0:
+            return 0.0
+        return 1 - self.points_kept / self.points_read
+
+# Ranges of up to this many points are measured one point at a time, which is
+# faster than NumPy for so few.
+SHORT_RANGE = 64
+
+# Simplify a path of (x, y) coordinates with the Douglas-Peucker algorithm and
+# return the indexes of the points to keep, in order. The first and last points
+# are always kept. Instead of recursing, the ranges of points that still have
+# to be checked are kept on a stack. The points of a long range are measured
+# all at once with NumPy, which is only needed if a path is simplified.
+def douglas_peucker(coordinates, tolerance):
+    import numpy as np
+
+    count = len(coordinates)
+    if count < 3:
+        return list(range(count))
+
+    xs, ys = np.array(coordinates, dtype=float).T
+    keep = bytearray(count)
+    keep[0] = keep[-1] = 1
+    tolerance_squared = tolerance * tolerance
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        # Find the point in between that is farthest from the segment from the
+        # first point to the last.
+        if last - first <= SHORT_RANGE:
+            farthest, farthest_distance = find_farthest(coordinates, first,
+                    last)
+        else:
+            x1 = xs[first]
+            y1 = ys[first]
+            dx = xs[last] - x1
+            dy = ys[last] - y1
+            length_squared = dx * dx + dy * dy
+            x = xs[first + 1:last] - x1
+            y = ys[first + 1:last] - y1
+            if length_squared == 0:
+                distances = x * x + y * y
+            else:
+                t = np.clip((x * dx + y * dy) / length_squared, 0.0, 1.0)
+                distance_x = x - t * dx
+                distance_y = y - t * dy
+                distances = distance_x * distance_x + distance_y * distance_y
+            farthest = int(np.argmax(distances))
+            farthest_distance = distances[farthest]
+            farthest += first + 1
+
+        if farthest_distance > tolerance_squared:
+            keep[farthest] = 1
+            stack.append((farthest, last))
+            stack.append((first, farthest))
+
+    return [index for index in range(count) if keep[index]]
+
+# Find the point between first and last that is farthest from the segment from
+# the first point to the last, one point at a time. Returns its index and the
+# square of its distance.
+def find_farthest(coordinates, first, last):
+    x1, y1 = coordinates[first]
+    x2, y2 = coordinates[last]
+    dx = x2 - x1
+    dy = y2 - y1
+    length_squared = dx * dx + dy * dy
+    farthest = first
+    farthest_distance = -1.0
+    for index in range(first + 1, last):
+        x, y = coordinates[index]
+        if length_squared == 0:
+            t = 0.0
+        else:
+            t = ((x - x1) * dx + (y - y1) * dy) / length_squared
+            if t < 0:
+                t = 0.0
+            elif t > 1:
+                t = 1.0
+        distance_x = x - x1 - t * dx
+        distance_y = y - y1 - t * dy
+        distance = distance_x * distance_x + distance_y * distance_y
+        if distance > farthest_distance:
+            farthest = index
+            farthest_distance = distance
+    return farthest, farthest_distance
@@ -0,0 +1,277 @@
+######################################################################
+# spatialindex.py                                                    #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Build and search a grid index of the Point placemarks in a KML     #
+# file, along with the text of the placemarks. The index is saved    #
+# next to the KML file so that it only has to be built once.         #
+#                                                                    #
+######################################################################
+
+import io
+import math
+import mmap
+import os
+import struct
+from array import array
+
+from kmlreader import iter_features
+from kmlwriter import KML_TAG_PREFIX, serialize_element
+
+# The index of a KML file lives next to it with this suffix appended.
+INDEX_SUFFIX = '.grid'
+
+# The size of the grid cells in degrees, unless some other size is asked for.
+DEFAULT_CELL_SIZE = 1.0
+
+# The mean radius of the Earth in kilometers.
+EARTH_RADIUS = 6371.0
+
+# The layout of the index file. After the header comes the text of the
+# placemarks, in the order they are in the KML file, then a table of the grid
+# cells that have points in them, sorted by row and then column, and then a
+# table of the points, sorted by cell. Each point has its coordinates and the
+# offset and length of its Placemark in the text.
+HEADER = struct.Struct('<8sQqdQQQ')
+CELL = struct.Struct('<iiQQ')
+POINT = struct.Struct('<ddQQ')
+MAGIC = b'KMLGRID2'
+
+PLACEMARK_TAG = KML_TAG_PREFIX + 'Placemark'
+POINT_TAG = KML_TAG_PREFIX + 'Point'
+COORDINATES_TAG = KML_TAG_PREFIX + 'coordinates'
+
+class GridIndex:
+    # Open the index of a KML file, building it first if it doesn't exist yet,
+    # if the KML file has changed since it was built, or if it was built with a
+    # different cell size than the one given. If the index can't be written
+    # next to the KML file, it is built in memory instead and only lasts as
+    # long as this GridIndex.
+    def __init__(self, kml_file, cell_size=None):
+        self.kml_file = kml_file
+        index_file = kml_file + INDEX_SUFFIX
+        self.data = None
+        if cell_size is None:
+            build_cell_size = DEFAULT_CELL_SIZE
+        elif math.isfinite(cell_size) and cell_size > 0:
+            build_cell_size = cell_size
+        else:
+            raise ValueError('the grid cells must have a size')
+        if not index_is_current(index_file, kml_file, cell_size):
+            try:
+                build_index(kml_file, index_file, build_cell_size)
+            except OSError:
+                index = io.BytesIO()
+                write_index(kml_file, index, build_cell_size)
+                self.data = index.getvalue()
+
+        if self.data is None:
+            with open(index_file, 'rb') as index:
+                self.data = mmap.mmap(index.fileno(), 0,
+                        access=mmap.ACCESS_READ)
+        (magic, kml_size, kml_mtime_ns, self.cell_size, text_size,
+                self.cell_count, self.point_count) = HEADER.unpack_from(
+                        self.data)
+        self.cells_start = HEADER.size + text_size
+        self.points_start = self.cells_start + self.cell_count * CELL.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    # The text of the Placemark of a point from one of the queries.
+    def placemark_text(self, offset, length):
+        start = HEADER.size + offset
+        return self.data[start:start + length].decode('utf-8')
+
+    # Return a list of (longitude, latitude, offset, length) tuples for the
+    # points inside of a bounding box, in the order they appear in the KML
+    # file. A box with west greater than east crosses the antimeridian. The
+    # offset and length are passed to placemark_text to get the text of the
+    # point's Placemark.
+    def query_bbox(self, west, south, east, north):
+        if west > east:
+            return sorted(self.query_bbox(west, south, 180, north) +
+                    self.query_bbox(-180, south, east, north),
+                    key=lambda point: point[2])
+
+        first_column = math.floor(west / self.cell_size)
+        last_column = math.floor(east / self.cell_size)
+        points = []
+        for row in range(math.floor(south / self.cell_size),
+                math.floor(north / self.cell_size) + 1):
+            # The cells of each row are next to each other in the cell table,
+            # so only the start of the row's part of the box has to be found.
+            cell_number = self.find_cell(row, first_column)
+            while cell_number < self.cell_count:
+                column, cell_row, first, count = CELL.unpack_from(self.data,
+                        self.cells_start + cell_number * CELL.size)
+                if cell_row != row or column > last_column:
+                    break
+                for point_number in range(first, first + count):
+                    point = POINT.unpack_from(self.data,
+                            self.points_start + point_number * POINT.size)
+                    if (west <= point[0] <= east and
+                            south <= point[1] <= north):
+                        points.append(point)
+                cell_number += 1
+
+        points.sort(key=lambda point: point[2])
+        return points
+
+    # Return the points within radius kilometers of a point, measured along
+    # the surface of the Earth.
+    def query_radius(self, longitude, latitude, radius):
+        # Search the box around the circle, then throw out the corners.
+        latitude_span = math.degrees(radius / EARTH_RADIUS)
+        south = max(latitude - latitude_span, -90)
+        north = min(latitude + latitude_span, 90)
+        widest_latitude = math.radians(max(abs(south), abs(north)))
+        if north >= 90 or south <= -90 or math.cos(widest_latitude) == 0:
+            longitude_span = 180
+        else:
+            longitude_span = min(latitude_span / math.cos(widest_latitude), 180)
+
+        if longitude_span >= 180:
+            candidates = self.query_bbox(-180, south, 180, north)
+        else:
+            west = wrap_longitude(longitude - longitude_span)
+            east = wrap_longitude(longitude + longitude_span)
+            candidates = self.query_bbox(west, south, east, north)
+
+        return [point for point in candidates
+                if haversine(longitude, latitude, point[0], point[1]) <= radius]
+
+    # Binary search the cell table for the first cell at or after a column in a
+    # row.
+    def find_cell(self, row, column):
+        low = 0
+        high = self.cell_count
+        while low < high:
+            middle = (low + high) // 2
+            middle_column, middle_row = CELL.unpack_from(self.data,
+                    self.cells_start + middle * CELL.size)[:2]
+            if (middle_row, middle_column) < (row, column):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+# The distance in kilometers between two points on the surface of the Earth.
+def haversine(longitude1, latitude1, longitude2, latitude2):
+    longitude1, latitude1, longitude2, latitude2 = map(math.radians,
+            [longitude1, latitude1, longitude2, latitude2])
+    a = (math.sin((latitude2 - latitude1) / 2) ** 2 +
+            math.cos(latitude1) * math.cos(latitude2) *
+            math.sin((longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+def wrap_longitude(longitude):
+    return (longitude + 180) % 360 - 180
+
+# Check whether an index file exists and was built from the current version of
+# the KML file, with the given cell size if there is one. An index with a cell
+# size that isn't a positive number is never current.
+def index_is_current(index_file, kml_file, cell_size=None):
+    if not os.path.exists(index_file):
+        return False
+
+    with open(index_file, 'rb') as index:
+        header = index.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return False
+
+    (magic, kml_size, kml_mtime_ns, index_cell_size, text_size, cell_count,
+            point_count) = HEADER.unpack(header)
+    kml_stat = os.stat(kml_file)
+    return (magic == MAGIC and kml_size == kml_stat.st_size and
+            kml_mtime_ns == kml_stat.st_mtime_ns and
+            math.isfinite(index_cell_size) and index_cell_size > 0 and
+            (cell_size is None or cell_size == index_cell_size))
+
+# Yield (longitude, latitude, text) for each Placemark in a KML file that
+# contains a Point, where text is the Placemark written out again as KML. The
+# file is parsed, so placemarks with a namespace prefix, in CDATA or commented
+# out are handled the way any other KML reader would handle them.
+def iter_point_placemarks(kml_file):
+    for event, element in iter_features(kml_file):
+        if event != 'feature' or element.tag != PLACEMARK_TAG:
+            continue
+        point = element.find('.//' + POINT_TAG)
+        if point is None:
+            continue
+        coordinates = point.find(COORDINATES_TAG)
+        if coordinates is None or coordinates.text is None:
+            continue
+        try:
+            longitude, latitude = map(float,
+                    coordinates.text.strip().split(',')[:2])
+        except ValueError:
+            continue
+
+        parts = []
+        serialize_element(element, parts)
+        yield longitude, latitude, ''.join(parts).encode('utf-8')
+
+# Scan a KML file for Point placemarks and write an index of them. The index is
+# written to a temporary file and moved into place, so that another process
+# never sees a half written index.
+def build_index(kml_file, index_file, cell_size):
+    temporary_file = '{}.{}.tmp'.format(index_file, os.getpid())
+    try:
+        with open(temporary_file, 'wb') as index:
+            write_index(kml_file, index, cell_size)
+        os.replace(temporary_file, index_file)
+    finally:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+
+# Write an index of the Point placemarks in a KML file to a binary file that
+# can be seeked in. The text of the placemarks is written as they are read, and
+# the header is filled in at the end.
+def write_index(kml_file, index, cell_size):
+    kml_stat = os.stat(kml_file)
+    longitudes = array('d')
+    latitudes = array('d')
+    offsets = array('Q')
+    lengths = array('Q')
+    index.write(bytes(HEADER.size))
+    text_size = 0
+    for longitude, latitude, text in iter_point_placemarks(kml_file):
+        longitudes.append(longitude)
+        latitudes.append(latitude)
+        offsets.append(text_size)
+        lengths.append(len(text))
+        index.write(text)
+        text_size += len(text)
+
+    # Sort the points by the row and then the column of their cell.
+    def cell_of(point_number):
+        return (math.floor(latitudes[point_number] / cell_size),
+                math.floor(longitudes[point_number] / cell_size))
+    order = sorted(range(len(offsets)), key=cell_of)
+
+    cells = []
+    for position, point_number in enumerate(order):
+        row, column = cell_of(point_number)
+        if cells and cells[-1][:2] == [column, row]:
+            cells[-1][3] += 1
+        else:
+            cells.append([column, row, position, 1])
+
+    for cell in cells:
+        index.write(CELL.pack(*cell))
+    for point_number in order:
+        index.write(POINT.pack(longitudes[point_number],
+            latitudes[point_number], offsets[point_number],
+            lengths[point_number]))
+    index.seek(0)
+    index.write(HEADER.pack(MAGIC, kml_stat.st_size, kml_stat.st_mtime_ns,
+        cell_size, text_size, len(cells), len(order)))
@@ -0,0 +1,151 @@
+######################################################################
+# stats.py                                                           #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Measure where the command line scripts spend their time. Every     #
+# script takes --stats to print how long each stage took, how many   #
+# rows it handled and how much memory it used, and --profile FILE    #
+# to save a cProfile of the run.                                     #
+#                                                                    #
+######################################################################
+
+import contextlib
+import cProfile
+import os.path
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The options to add to the defaults that a script gives parse_options.
+STATS_OPTIONS = {'--stats': False, '--profile': None}
+
+# A line for the usage message of each script that takes STATS_OPTIONS.
+STATS_USAGE = ('--stats prints timings, rows/s and memory use to stderr; '
+        '--profile=FILE saves a cProfile of the run')
+
+# The progress on stderr is updated at most this often, in seconds.
+PROGRESS_INTERVAL = 1.0
+
+# Rows that are counted one at a time are added to the count in batches of this
+# many, so that counting them doesn't slow down the loop that makes them.
+COUNT_BATCH_SIZE = 1000
+
+class Stats:
+    # Start measuring a run of a script, given the options that were parsed
+    # with STATS_OPTIONS and the files that it reads and writes. Nothing is
+    # measured unless --stats or --profile was given.
+    def __init__(self, options, input_files=(), output_files=()):
+        self.enabled = options['--stats']
+        self.profile_file = options['--profile']
+        self.input_files = list(input_files)
+        self.output_files = list(output_files)
+        self.stages = []
+        self.rows = 0
+        self.showing_progress = False
+        self.start = self.last_progress = time.perf_counter()
+        self.start_children_rss = children_peak_rss()
+
+        self.profiler = None
+        if self.profile_file is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.finish()
+
+    # Time a stage of the run, such as reading an index or converting a file.
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    # Add to the number of rows that have been handled, and show the progress
+    # on stderr every so often.
+    def add_rows(self, count):
+        if not self.enabled:
+            return
+        self.rows += count
+        now = time.perf_counter()
+        if now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.showing_progress = True
+            print('\r{:,} rows, {:,.0f} rows/s '.format(self.rows,
+                self.rows / (now - self.start)), end='', file=sys.stderr,
+                flush=True)
+
+    # Yield the items of an iterable, counting each one as a row. Without
+    # --stats, the iterable is returned as it is.
+    def count_rows(self, iterable):
+        if not self.enabled:
+            return iterable
+        return self.iter_counted(iterable)
+
+    def iter_counted(self, iterable):
+        count = 0
+        for item in iterable:
+            yield item
+            count += 1
+            if count == COUNT_BATCH_SIZE:
+                self.add_rows(count)
+                count = 0
+        self.add_rows(count)
+
+    # Stop measuring, save the profile if there is one and print the
+    # statistics if they were asked for.
+    def finish(self):
+        seconds = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_file)
+            self.profiler = None
+        if not self.enabled:
+            return
+        self.enabled = False
+
+        if self.showing_progress:
+            print(file=sys.stderr)
+        report = ['{:<16}{:>10.3f} s'.format(name, stage_seconds)
+                for name, stage_seconds in self.stages]
+        report.append('{:<16}{:>10.3f} s'.format('total', seconds))
+        if self.rows:
+            report.append('{:<16}{:>10,} ({:,.0f} rows/s)'.format('rows',
+                self.rows, self.rows / seconds))
+        bytes_read = total_size(self.input_files)
+        bytes_written = total_size(self.output_files)
+        report.append('{:<16}{:>10.1f} MB ({:.1f} MB/s)'.format('read',
+            bytes_read / 1e6, bytes_read / 1e6 / seconds))
+        report.append('{:<16}{:>10.1f} MB ({:.1f} MB/s)'.format('written',
+            bytes_written / 1e6, bytes_written / 1e6 / seconds))
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux. Worker processes are counted
+            # separately, by the largest of them.
+            report.append('{:<16}{:>10.1f} MB'.format('peak memory',
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+            children = children_peak_rss()
+            if children > self.start_children_rss:
+                report.append('{:<16}{:>10.1f} MB'.format('worker memory',
+                    children / 1024))
+        print('\n'.join(report), file=sys.stderr)
+
+# The largest peak resident set size in kilobytes of the child processes that
+# have finished. This can already be more than zero when a script starts, if the
+# process that became it had children of its own.
+def children_peak_rss():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+# The total size in bytes of the files in a list that exist.
+def total_size(files):
+    return sum(os.path.getsize(name) for name in files if os.path.isfile(name))
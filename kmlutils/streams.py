@@ -0,0 +1,166 @@
+######################################################################
+# streams.py                                                         #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Read points and placemarks from CSV and KML files as generators,   #
+# and write them to KML and CSV files, so that conversions can be    #
+# chained together in one process without intermediate files.       #
+#                                                                    #
+######################################################################
+
+import itertools
+import re
+
+from compressed import open_input
+from kmlreader import iter_coordinates, iter_elements
+from kmlwriter import KMLWriter, KML_TAG_PREFIX, BUFFER_SIZE
+
+# Input is read in blocks of this many bytes.
+BLOCK_SIZE = 1024 * 1024
+
+# Paths are written this many points at a time.
+PATH_BATCH_SIZE = 10000
+
+# Regular expressions for parsing the CSV file.
+# Note that the delimiter can be a tab or a comma. A line is data if it starts
+# with two decimal numbers.
+decimal = '-?[0-9]+(.[0-9]+)?'
+delimiter = '[\t,]'
+line_validation = re.compile(decimal + delimiter + decimal)
+
+# This finds the same lines as line_validation, but it works on a whole block of
+# lines at once and captures the first two fields of each line as the longitude
+# and latitude, without any trailing whitespace.
+point_finder = re.compile('^(-?[0-9]+(?:[^\t,\n][0-9]+)?)' + delimiter +
+        '(-?[0-9](?:[^\t,\n]*[^\t,\n\\s])?)', re.MULTILINE)
+
+placemark_tag = KML_TAG_PREFIX + 'Placemark'
+name_path = KML_TAG_PREFIX + 'name'
+point_coordinates_path = '{0}Point/{0}coordinates'.format(KML_TAG_PREFIX)
+
+# If the first line of a file is not data, it is used as the name of the
+# section. Return the name, or None if there isn't one, and the offset in the
+# file where the data starts.
+def read_section_name(input_file):
+    with open_input(input_file) as current_file:
+        first_line = current_file.readline().decode()
+
+    if line_validation.match(first_line):
+        return None, 0
+    return first_line.strip(), len(first_line.encode())
+
+# Read the lines of a file that start between the offsets start and end (or the
+# end of the file, if end is None) in large blocks that each end at the end of
+# a line. Offsets in a compressed file are in its decompressed contents.
+def iter_blocks(input_file, start=0, end=None):
+    with open_input(input_file) as current_file:
+        # A line that starts before start belongs to the previous chunk. A
+        # compressed file can only be skipped through by reading it.
+        position = 0
+        if start > 0:
+            if current_file.seekable():
+                current_file.seek(start - 1)
+            else:
+                current_file.read(start - 1)
+            position = start - 1 + len(current_file.readline())
+        remainder = b''
+        while end is None or position < end:
+            if end is None:
+                block = current_file.read(BLOCK_SIZE)
+            else:
+                block = current_file.read(min(BLOCK_SIZE, end - position))
+            if not block:
+                break
+            position += len(block)
+
+            block = remainder + block
+            cut = block.rfind(b'\n') + 1
+            remainder = block[cut:]
+            if cut:
+                yield block[:cut].decode()
+
+        # Finish the line that runs past the end of the chunk.
+        if remainder:
+            yield (remainder + current_file.readline()).decode()
+
+# Find every line in a block of text that starts with a pair of coordinates and
+# return a list of their (longitude, latitude) pairs.
+def parse_points(block):
+    return point_finder.findall(block)
+
+# Yield the (longitude, latitude) pairs of a CSV file as lists, one for each
+# block of the file that is read. Like iter_blocks, only the lines that start
+# between start and end are read.
+def iter_csv_point_lists(input_file, start=0, end=None):
+    for block in iter_blocks(input_file, start, end):
+        yield parse_points(block)
+
+# Yield the (longitude, latitude) pair of each line of a CSV file that starts
+# with a pair of coordinates. The coordinates are strings, just as they are
+# written in the file.
+def iter_csv_points(input_file):
+    return itertools.chain.from_iterable(iter_csv_point_lists(input_file))
+
+# Yield the coordinates in every <coordinates> tag of a KML file as tuples of
+# strings: (longitude, latitude) or (longitude, latitude, altitude).
+def iter_kml_points(input_file):
+    for coordinates in iter_coordinates(input_file):
+        for coordinate_line in coordinates.strip().split('\n'):
+            split_coordinate = coordinate_line.strip().split(',')
+            if len(split_coordinate) >= 2:
+                yield tuple(split_coordinate[:3])
+
+# Yield the (longitude, latitude, name) of each Placemark in a KML file that has
+# a Point. The name is None if the Placemark doesn't have one.
+def iter_placemarks(input_file):
+    for placemark in iter_elements(input_file, {placemark_tag}):
+        coordinates = placemark.findtext(point_coordinates_path)
+        if coordinates is None:
+            continue
+        split_coordinate = coordinates.strip().split(',')
+        if len(split_coordinate) >= 2:
+            yield (split_coordinate[0].strip(), split_coordinate[1].strip(),
+                    placemark.findtext(name_path))
+
+# Write a Placemark to a new KML document for each point, which can be a
+# (longitude, latitude) or a (longitude, latitude, name) tuple. output is a file
+# name or an open text file, like for KMLWriter. Returns the number of points.
+def write_kml_placemarks(points, output, name=None, container='Folder'):
+    count = 0
+    with KMLWriter(output, container=container) as kml:
+        if name:
+            kml.write_name(name)
+        for point in points:
+            kml.write_placemark(*point)
+            count += 1
+    return count
+
+# Write a new KML document with a path through (longitude, latitude) points.
+# Returns the number of points.
+def write_kml_path(points, output, name=None):
+    count = 0
+    points = iter(points)
+    with KMLWriter(output) as kml:
+        kml.begin_path(name)
+        while True:
+            batch = list(itertools.islice(points, PATH_BATCH_SIZE))
+            if not batch:
+                break
+            kml.write_path_points(batch)
+            count += len(batch)
+    return count
+
+# Write each row, which is a tuple of strings, as a line of delimited text.
+# output is a file name or an open text file, which is left open. Returns the
+# number of rows.
+def write_delimited(rows, output, delimiter='\t'):
+    if isinstance(output, str):
+        with open(output, 'w', buffering=BUFFER_SIZE) as output_file:
+            return write_delimited(rows, output_file, delimiter)
+
+    count = 0
+    for row in rows:
+        output.write(delimiter.join(row) + '\n')
+        count += 1
+    return count
@@ -8,64 +8,213 @@
 #                                                                    #
 ######################################################################
 
+import io
 import os.path
 import sys
 
+from noaa_index import open_event_index, find_event_type
+from noaa_manifest import update_output, print_update, remove_manifest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'kmlutils'))
+from aggregate import aggregate_points, write_cells
+from compressed import open_input
+from kmlgroups import write_groups
+from kmltiles import write_tiles
+from kmlwriter import (KMLWriter, KMLAppender, KMLFragmentWriter, closing_tags,
+        is_kmz)
+from options import parse_options, parse_jobs
+from parallel import iter_results, iter_chunks, iter_in_thread
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
+from streams import write_kml_placemarks
+
+# With more than one job, the lines of the locations file are converted this
+# many at a time.
+CHUNK_ROWS = 10000
+
+# The index of event types in each worker process, from open_worker_index.
+worker_index = None
+
 def main():
-    if len(sys.argv) != 4:
+    # The -l option splits the output into tiles of at most that many
+    # placemarks. The -g option combines the storms in each cell of a grid
+    # with cells of that many degrees into one placemark. The -f option puts
+    # the storms of each event type in a folder of their own. The -u option
+    # updates the output from a previous run instead of writing it again. The
+    # -j option sets the number of processes that convert the locations.
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                dict({'-l': None, '-g': None, '-f': False, '-u': False,
+                    '-j': '1'}, **STATS_OPTIONS),
+                {'--tiles': '-l', '--grid': '-g', '--folders': '-f',
+                    '--update': '-u', '--jobs': '-j'})
+        jobs = parse_jobs(options['-j'])
+        if options['-l'] is None:
+            tile_size = None
+        else:
+            tile_size = int(options['-l'])
+            if tile_size < 1:
+                raise ValueError('tiles must hold at least one placemark')
+        if options['-g'] is None:
+            cell_size = None
+        else:
+            cell_size = float(options['-g'])
+            if not cell_size > 0:
+                raise ValueError('the grid cells must have a size')
+    except ValueError:
+        print_usage()
+
+    by_type = options['-f']
+    if (tile_size is not None) + (cell_size is not None) + by_type > 1:
+        print_usage()
+
+    if len(file_args) != 3:
+        print_usage()
+    locations_file, details_file, output = file_args
+
+    # Only a flat KML file can be added to.
+    update = options['-u']
+    if update and (tile_size is not None or cell_size is not None or by_type or
+            is_kmz(output)):
+        print_usage()
+
+    # Only a flat KML file can be written by more than one process.
+    if jobs > 1 and (tile_size is not None or cell_size is not None or by_type
+            or update):
         print_usage()
 
     # Check if the output file already exists
-    if os.path.exists(sys.argv[3]):
-        user_response = input(sys.argv[3] + ' already exists. Overwrite it? [y/N] ')
+    if os.path.exists(output) and not update:
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
         if user_response == '' or user_response[0] != 'y':
             exit()
 
-    # Strings containing the text of the resulting KML document.
-    header  = ('<?xml version="1.0" encoding="UTF-8"?>\n'
-               '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
-               '<Folder>\n')
-    body    =  ''
-    section = ('\t<Placemark>\n'
-               '\t\t<name>{}</name>\n'
-               '\t\t<Point>\n'
-               '\t\t\t<coordinates>{},{}</coordinates>\n'
-               '\t\t</Point>\n'
-               '\t</Placemark>\n')
-    footer  = ('</Folder>\n'
-               '</kml>\n')
-
-    # Parse the input files and build the string containing the body of the KML
-    # document as we go.
-    with open(sys.argv[1]) as locations:
-        for line in locations:
-            line_fields = line.split(',')
-
-            # Skip the line if it's event_id isn't a number (this is for
-            # skipping the header line)
-            if not line_fields[2].isdigit():
-                continue
-
-            name = find_event_type(line_fields[2])
-            latitude = line_fields[7]
-            longitude = line_fields[8]
-
-            body = body + section.format(name, longitude, latitude)
-
-    # Write the resulting KML to a file.
-    with open(sys.argv[3], 'w') as output_file:
-        output_file.write(header + body + footer)
-
-def find_event_type(event_id):
-    with open(sys.argv[2]) as details:
-        for line in details:
-            if event_id in line:
-                return line.split(',')[12].strip('"')
+    with Stats(options, [locations_file, details_file], [output]) as stats:
+        # Open the index of event types in the details file so that each
+        # location can be looked up without rescanning the file.
+        with stats.stage('details index'):
+            event_index = open_event_index(details_file)
+
+        with stats.stage('convert'):
+            if update:
+                print_update(output, *update_locations(locations_file,
+                    details_file, event_index, output, stats))
+            elif jobs > 1:
+                remove_manifest(output)
+                convert_locations_parallel(locations_file, details_file,
+                        output, jobs, stats)
+            else:
+                remove_manifest(output)
+                convert_locations(locations_file, event_index, output,
+                        tile_size, cell_size, by_type, stats)
+
+# Parse the locations file and write the KML document as we go. With a
+# cell_size, the storms are counted in a grid and the grid is written at the
+# end. With by_type, they are sorted into a folder for each event type.
+def convert_locations(locations_file, event_index, output, tile_size,
+        cell_size, by_type, stats):
+    with open_input(locations_file, 'r') as locations:
+        points = stats.count_rows(iter_locations(locations, event_index))
+        if cell_size is not None:
+            cells = aggregate_points(points, cell_size)
+            with KMLWriter(output, container='Folder') as kml:
+                write_cells(kml, cells)
+        elif by_type:
+            write_groups(points, output)
+        elif tile_size is None:
+            write_kml_placemarks(points, output)
+        else:
+            tile_directory, skipped = write_tiles(points, output, tile_size)
+            if skipped:
+                print('Skipped {:,} storms whose coordinates are not '
+                        'numbers'.format(skipped), file=sys.stderr)
+
+# Convert the locations file into a flat KML file in a pipeline: a thread reads
+# the file in chunks of CHUNK_ROWS lines, a pool of jobs processes looks up the
+# event types of the chunks and turns them into placemarks, and the placemarks
+# are written in the same order as the lines they came from. The output is
+# the same as with one job.
+def convert_locations_parallel(locations_file, details_file, output, jobs,
+        stats):
+    with open_input(locations_file, 'r') as locations, \
+            KMLWriter(output, container='Folder') as kml:
+        chunks = iter_in_thread(iter_chunks(locations, CHUNK_ROWS))
+        for text, count in iter_results(format_chunk, chunks, jobs,
+                open_worker_index, (details_file,)):
+            kml.output_file.write(text)
+            stats.add_rows(count)
+
+# Open the index of the details file in a worker process. The index has already
+# been built by the main process, so this only has to open it.
+def open_worker_index(details_file):
+    global worker_index
+    worker_index = open_event_index(details_file)
+
+# Turn a chunk of lines of the locations file into placemarks in a worker
+# process. Returns the text of the placemarks and the number of them.
+def format_chunk(lines):
+    count = 0
+    text = io.StringIO()
+    with KMLFragmentWriter(text, ['Folder']) as kml:
+        for point in iter_locations(lines, worker_index):
+            kml.write_placemark(*point)
+            count += 1
+    return text.getvalue(), count
+
+# Bring a flat KML file that was written by an earlier run up to date, by only
+# adding the storms that are new since then. See update_output.
+def update_locations(locations_file, details_file, event_index, output, stats):
+    def write_lines(lines):
+        write_kml_placemarks(iter_locations(stats.count_rows(lines),
+            event_index), output)
+        return os.path.getsize(output) - len(closing_tags(['Folder']))
+
+    def append_lines(lines, footer_offset):
+        with KMLAppender(output, footer_offset, ['Folder']) as kml:
+            for point in iter_locations(stats.count_rows(lines), event_index):
+                kml.write_placemark(*point)
+        return os.path.getsize(output) - len(closing_tags(['Folder']))
+
+    return update_output(output, locations_file, details_file, event_index,
+            write_lines, append_lines)
+
+# Yield the (longitude, latitude, event type) of each location in a NOAA
+# locations file.
+def iter_locations(locations, event_index):
+    for line in locations:
+        line_fields = line.split(',')
+
+        # Skip the line if it's event_id isn't a number (this is for
+        # skipping the header line)
+        if not line_fields[2].isdigit():
+            continue
+
+        name = find_event_type(event_index, line_fields[2])
+        latitude = line_fields[7]
+        longitude = line_fields[8]
+
+        yield longitude, latitude, str(name)
 
 def print_usage():
     print((
-            'Usage: {} LOCATIONS_FILE DETAILS_FILE OUTPUT'
-            ).format(sys.argv[0]), file=sys.stderr)
+            'Usage: {} [-l=TILE_SIZE | -g=CELL_SIZE | -f | -u | -j=JOBS] '
+            '[--stats]\n[--profile=FILE] LOCATIONS_FILE DETAILS_FILE OUTPUT\n'
+            'With -l, the output is split into a tree of tiles that each hold '
+            'at most\nTILE_SIZE placemarks, which are linked together by '
+            'regions and only loaded\nwhen they are in view.\n'
+            'With -g, the storms in each CELL_SIZE by CELL_SIZE degree cell '
+            'of a grid are\ncombined into one placemark with their count and '
+            'the number of each type.\n'
+            'With -f, the storms of each event type are put in a folder of '
+            'their own, with\na color for each type.\n'
+            'With -u, an OUTPUT from an earlier run with -u is brought up to '
+            'date by only\nadding the storms that are new, unless some of '
+            'the old ones have changed.\n'
+            'With -j, the placemarks are made by JOBS processes at once.\n'
+            'Input files ending in .gz, .bz2 or .xz are decompressed as they '
+            'are read.\n'
+            '{}'
+            ).format(sys.argv[0], STATS_USAGE), file=sys.stderr)
     exit()
 
 if __name__ == '__main__':
@@ -0,0 +1,218 @@
+######################################################################
+# noaa_batch.py                                                      #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Convert many years of NOAA storm event files at once. The          #
+# locations and details files of each year are paired up, the years  #
+# are converted in a pool of processes and the results are put       #
+# together into one output file, in order by year.                   #
+#                                                                    #
+######################################################################
+
+import glob
+import os.path
+import re
+import shutil
+import sys
+
+from noaa_index import open_event_index
+import noaa2kml
+import refine_noaa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'kmlutils'))
+from compressed import open_input
+from kmlwriter import KMLWriter, KMLFragmentWriter, is_kmz
+from options import parse_options, parse_jobs
+from parallel import iter_piece_results, copy_piece
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
+
+# The names of NOAA's files, like
+# StormEvents_locations-ftp_v1.0_d2014_c20150701.csv.gz, which give the kind of
+# file, the year of the storms in it and the date it was created.
+noaa_file_name = re.compile(r'StormEvents_(locations|details)-.*_d([0-9]{4})_'
+        r'c([0-9]+)\.csv(\.gz|\.bz2|\.xz)?$')
+
+def main():
+    # The -j option sets how many years are converted at once.
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                dict({'-j': str(os.cpu_count() or 1)}, **STATS_OPTIONS),
+                {'--jobs': '-j'})
+        jobs = parse_jobs(options['-j'])
+    except ValueError:
+        print_usage()
+    if len(file_args) < 2:
+        print_usage()
+    output = file_args[-1]
+
+    years, unpaired = find_year_files(file_args[:-1])
+    if not years and not unpaired:
+        print('No NOAA locations or details files were found.',
+                file=sys.stderr)
+        exit()
+
+    # Check if the output file already exists
+    if os.path.exists(output):
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
+        if user_response == '' or user_response[0] != 'y':
+            exit()
+
+    input_files = [name for year in sorted(years) for name in years[year]]
+    with Stats(options, input_files, [output]) as stats, \
+            stats.stage('convert'):
+        failures = convert_years(years, output, jobs, stats)
+
+    # Report each year that couldn't be converted.
+    print('Converted {} of {} years'.format(len(years) - len(failures),
+        len(years) + len(unpaired)), file=sys.stderr)
+    for year, kind in unpaired.items():
+        failures.append((year, 'there is no {} file'.format(kind)))
+    failures.sort()
+    for year, error in failures:
+        print('{}: {}'.format(year, error), file=sys.stderr)
+    if failures:
+        exit(1)
+
+# Find the NOAA files in a list of files, directories and glob patterns, and
+# pair up the locations and details files of each year. If there is more than
+# one version of a file, the one that was created last is used. Returns a
+# dictionary from each year to its (locations file, details file), and one from
+# each year that is missing a file to the kind of file it's missing.
+def find_year_files(paths):
+    file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_names.extend(os.path.join(path, name)
+                    for name in sorted(os.listdir(path)))
+        else:
+            file_names.extend(sorted(glob.glob(path)) or [path])
+
+    found = {}
+    for file_name in file_names:
+        match = noaa_file_name.search(os.path.basename(file_name))
+        if match is None:
+            continue
+        kind, year, created = match.group(1, 2, 3)
+        year_files = found.setdefault(int(year), {})
+        if kind not in year_files or created > year_files[kind][0]:
+            year_files[kind] = (created, file_name)
+
+    years = {}
+    unpaired = {}
+    for year, year_files in found.items():
+        if 'locations' not in year_files:
+            unpaired[year] = 'locations'
+        elif 'details' not in year_files:
+            unpaired[year] = 'details'
+        else:
+            years[year] = (year_files['locations'][1],
+                    year_files['details'][1])
+    return years, unpaired
+
+# Convert each year in a pool of jobs processes and put the results together in
+# order by year. A KML output (.kml or .kmz) gets a folder of placemarks for
+# each year, like noaa2kml.py writes. Anything else is written like
+# refine_noaa.py does, as a NumPy array if it ends in .npy or as tab separated
+# text otherwise. A year that fails is left out. Returns a list of the
+# (year, error message) of each year that failed.
+def convert_years(years, output, jobs, stats):
+    output_kind = output_format(output)
+    directory = os.path.dirname(os.path.abspath(output))
+    if output_kind == 'kml':
+        output_file = KMLWriter(output)
+        open_elements = output_file.open_elements + ['Folder']
+    elif output_kind == 'npy':
+        output_file = refine_noaa.StormArrayWriter(output)
+        open_elements = None
+    else:
+        output_file = refine_noaa.StormTextWriter(output)
+        open_elements = None
+
+    tasks = [(year, locations_file, details_file, output_kind, open_elements)
+            for year, (locations_file, details_file) in sorted(years.items())]
+    failures = []
+    with output_file:
+        pieces = iter_piece_results(convert_year, tasks, jobs, directory)
+        for task, (piece_file, (count, error)) in zip(tasks, pieces):
+            year = task[0]
+            if error is not None:
+                failures.append((year, error))
+                continue
+            stats.add_rows(count)
+            if output_kind == 'kml':
+                output_file.begin_folder(str(year))
+                copy_piece(piece_file, output_file.output_file)
+                output_file.end_folder()
+            elif output_kind == 'npy':
+                # The pieces are arrays of their own, so only their storms are
+                # copied, after their headers.
+                with open(piece_file, 'rb') as piece:
+                    piece.seek(refine_noaa.NPY_HEADER_SIZE)
+                    shutil.copyfileobj(piece, output_file.output_file,
+                            refine_noaa.BUFFER_SIZE)
+                output_file.count += count
+            else:
+                copy_piece(piece_file, output_file.output_file)
+    return failures
+
+# The kind of file to write: 'kml', 'npy' or 'text'.
+def output_format(output):
+    name = output.lower()
+    if name.endswith('.kml') or is_kmz(name):
+        return 'kml'
+    if name.endswith('.npy'):
+        return 'npy'
+    return 'text'
+
+# Convert the storms of one year in a worker process and write them to
+# piece_file. Returns the number of storms that were written and None, or None
+# and a message if the year couldn't be converted, so that one bad year doesn't
+# stop the others.
+def convert_year(task, piece_file):
+    year, locations_file, details_file, output_kind, open_elements = task
+    try:
+        event_index = open_event_index(details_file)
+        count = 0
+        with open_input(locations_file, 'r') as locations:
+            if output_kind == 'kml':
+                with KMLFragmentWriter(piece_file, open_elements) as kml:
+                    for point in noaa2kml.iter_locations(locations,
+                            event_index):
+                        kml.write_placemark(*point)
+                        count += 1
+                return count, None
+
+            if output_kind == 'npy':
+                output_file = refine_noaa.StormArrayWriter(piece_file)
+            else:
+                output_file = refine_noaa.StormTextWriter(piece_file)
+            with output_file:
+                for storm in refine_noaa.iter_storms(locations, event_index):
+                    output_file.write(*storm)
+                    count += 1
+        return count, None
+    except Exception as error:
+        return None, '{}: {}'.format(type(error).__name__, error)
+
+def print_usage():
+    print((
+            'Usage: {} [-j=JOBS] [--stats] [--profile=FILE] '
+            '{{FILES | DIRECTORIES | PATTERNS}} OUTPUT\n'
+            'Converts the NOAA StormEvents locations and details files of many '
+            'years at once.\nThe files of each year are matched by the year '
+            'in their names (like d2014),\nand JOBS years (default: one for '
+            'each CPU) are converted at a time.\n'
+            'If OUTPUT ends in .kml or .kmz, it gets a folder of placemarks '
+            'for each year,\nlike noaa2kml.py writes. Otherwise it is written '
+            'like refine_noaa.py does, as a\nNumPy array if it ends in .npy or '
+            'as tab separated text.\n'
+            'The years that fail are listed at the end, and the others are '
+            'still written.\n'
+            '{}'
+            ).format(sys.argv[0], STATS_USAGE), file=sys.stderr)
+    exit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+######################################################################
+# noaa_index.py                                                      #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Keep an index of the event types in a NOAA details file in a       #
+# sidecar file so that it only has to be built once.                 #
+#                                                                    #
+######################################################################
+
+import csv
+import itertools
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'kmlutils'))
+from compressed import open_input
+
+# Bump this whenever the layout of the index file changes so that old index
+# files get rebuilt.
+INDEX_VERSION = 1
+
+# The index of a details file lives next to it with this suffix appended.
+INDEX_SUFFIX = '.index'
+
+# At most this many event types are cached by each open index.
+CACHE_SIZE = 4096
+
+# Open the index for a details file, building it first if it doesn't exist yet
+# or if the details file has changed since the index was built. The result is
+# an EventIndex that can be passed to find_event_type.
+def open_event_index(details_file):
+    index_file = details_file + INDEX_SUFFIX
+    details_stat = os.stat(details_file)
+
+    if not index_is_current(index_file, details_stat):
+        try:
+            build_event_index(details_file, index_file, details_stat)
+        except OSError:
+            # If the index can't be written next to the details file, fall
+            # back on an index that only lives as long as this process.
+            index = sqlite3.connect(':memory:', factory=EventIndex)
+            fill_event_index(index, details_file, details_stat)
+            return index
+
+    index = sqlite3.connect('file:{}?mode=ro'.format(index_file), uri=True,
+            factory=EventIndex)
+    index.execute('PRAGMA mmap_size = 268435456')
+    return index
+
+# An sqlite connection to an index that keeps its own cache of the event types
+# that have been looked up in it, so that the cache goes away with the index.
+class EventIndex(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = {}
+
+# Look up the event type of an event in an index from open_event_index. None is
+# returned if the event isn't in the details file. The locations of an event are
+# usually next to each other, so recent lookups are cached, and the cache is
+# emptied whenever it fills up.
+def find_event_type(index, event_id):
+    cache = index.cache
+    try:
+        return cache[event_id]
+    except KeyError:
+        pass
+
+    row = index.execute('SELECT event_type FROM events WHERE event_id = ?',
+            (int(event_id),)).fetchone()
+    if len(cache) >= CACHE_SIZE:
+        cache.clear()
+    cache[event_id] = event_type = None if row is None else row[0]
+    return event_type
+
+# Yield the (event ID, event type) of every event in an index from
+# open_event_index, in order by event ID.
+def iter_event_types(index):
+    return index.execute('SELECT event_id, event_type FROM events '
+            'ORDER BY event_id')
+
+# Check whether an index file exists and was built from the current version of
+# the details file.
+def index_is_current(index_file, details_stat):
+    if not os.path.exists(index_file):
+        return False
+
+    try:
+        index = sqlite3.connect('file:{}?mode=ro'.format(index_file), uri=True)
+        try:
+            meta = dict(index.execute('SELECT key, value FROM meta'))
+        finally:
+            index.close()
+    except sqlite3.DatabaseError:
+        return False
+
+    return (meta.get('version') == INDEX_VERSION and
+            meta.get('size') == details_stat.st_size and
+            meta.get('mtime_ns') == details_stat.st_mtime_ns)
+
+# Build the index in a temporary file and move it into place, so that another
+# process never sees a half written index.
+def build_event_index(details_file, index_file, details_stat):
+    temporary_file = '{}.{}.tmp'.format(index_file, os.getpid())
+    try:
+        index = sqlite3.connect(temporary_file)
+        try:
+            index.execute('PRAGMA journal_mode = OFF')
+            index.execute('PRAGMA synchronous = OFF')
+            fill_event_index(index, details_file, details_stat)
+        finally:
+            index.close()
+        os.replace(temporary_file, index_file)
+    except (OSError, sqlite3.OperationalError) as error:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+        raise OSError(error)
+
+# Read the EVENT_ID and EVENT_TYPE columns of the details file into the events
+# table of an index. The columns are found by name in the header line, falling
+# back on their usual positions if the file has no header. The details file can
+# be compressed.
+def fill_event_index(index, details_file, details_stat):
+    index.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value)')
+    index.execute('CREATE TABLE events '
+            '(event_id INTEGER PRIMARY KEY, event_type TEXT)')
+
+    with open_input(details_file, 'r', newline='') as details:
+        reader = csv.reader(details)
+        first_row = next(reader, [])
+        if 'EVENT_ID' in first_row and 'EVENT_TYPE' in first_row:
+            id_column = first_row.index('EVENT_ID')
+            type_column = first_row.index('EVENT_TYPE')
+            rows = reader
+        else:
+            id_column = 7
+            type_column = 12
+            rows = itertools.chain([first_row], reader)
+
+        last_column = max(id_column, type_column)
+        index.executemany('INSERT OR REPLACE INTO events VALUES (?, ?)',
+                ((int(row[id_column]), row[type_column]) for row in rows
+                    if len(row) > last_column and row[id_column].isdigit()))
+
+    index.executemany('INSERT INTO meta VALUES (?, ?)',
+            [('version', INDEX_VERSION),
+             ('size', details_stat.st_size),
+             ('mtime_ns', details_stat.st_mtime_ns)])
+    index.commit()
@@ -0,0 +1,207 @@
+######################################################################
+# noaa_manifest.py                                                   #
+# Written by agent                                                   #
+# Created: 18 October 2026                                           #
+######################################################################
+# Keep a manifest of the storms that have been written to an output  #
+# file, so that when NOAA adds new months to its files the output    #
+# can be brought up to date without writing it all again.           #
+#                                                                    #
+######################################################################
+
+import json
+import os
+import sys
+import tempfile
+import zlib
+
+from noaa_index import find_event_type, iter_event_types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'kmlutils'))
+from compressed import open_input
+from kmlwriter import FooterError
+
+# Bump this whenever the layout of the manifest changes so that old manifests
+# are ignored.
+MANIFEST_VERSION = 1
+
+# The manifest of an output file lives next to it with this suffix appended.
+MANIFEST_SUFFIX = '.manifest'
+
+# Bring an output file up to date with a NOAA locations file and details file.
+# write_lines(lines) writes a whole new output from an iterable of lines of the
+# locations file, and append_lines(lines, footer_offset) adds them to the end of
+# the output that is already there, where footer_offset is the offset of
+# whatever has to stay at the end of the file, like the closing tags of a KML
+# document. Both return the new footer offset. append_lines raises a
+# FooterError if the output doesn't end where the manifest says it does.
+#
+# If the input files haven't changed since the manifest was written, nothing is
+# done. If the only difference is storms with new event IDs, their lines are
+# appended. Otherwise, like when a storm that was already written has moved,
+# changed its type or was removed, or there isn't a manifest yet, the whole
+# output is written again. The locations file is checked all the way through
+# before anything is appended, so the output is never appended to and then
+# written again. The lines of the new storms are kept in a temporary file
+# until then, and are the only ones that have to be converted, so an update
+# mostly costs one read through each of the files.
+# Returns 'unchanged', 'appended' or 'rebuilt' and the number of lines that
+# were written.
+def update_output(output, locations_file, details_file, event_index,
+        write_lines, append_lines):
+    stamps = file_stamps([locations_file, details_file])
+    manifest = read_manifest(output)
+    if manifest is not None and manifest['inputs'] == stamps:
+        return 'unchanged', 0
+
+    # The output is about to change, so the manifest no longer describes it.
+    remove_manifest(output)
+
+    if manifest is not None and not types_changed(manifest['events'],
+            event_index):
+        checksums = EventChecksums(manifest['events'])
+        with tempfile.TemporaryFile('w+', encoding='utf-8',
+                dir=os.path.dirname(os.path.abspath(output))) as new_lines:
+            with open_input(locations_file, 'r') as locations:
+                new_lines.writelines(checksums.filter_new(locations))
+            if checksums.only_added():
+                new_lines.seek(0)
+                try:
+                    footer_offset = append_lines(new_lines,
+                            manifest['footer_offset'])
+                except FooterError as error:
+                    print('{}; writing all of it again'.format(error),
+                            file=sys.stderr)
+                except BaseException:
+                    # The writers cut the output back to what it was, so the
+                    # old manifest describes it again.
+                    write_manifest(output, manifest['inputs'],
+                            manifest['footer_offset'], manifest['events'])
+                    raise
+                else:
+                    checksums.add_types(event_index)
+                    write_manifest(output, stamps, footer_offset,
+                            checksums.events)
+                    return 'appended', checksums.new_lines
+
+    checksums = EventChecksums()
+    with open_input(locations_file, 'r') as locations:
+        footer_offset = write_lines(checksums.filter_new(locations))
+    checksums.add_types(event_index)
+    write_manifest(output, stamps, footer_offset, checksums.events)
+    return 'rebuilt', checksums.new_lines
+
+# Say what update_output did on stderr.
+def print_update(output, action, lines):
+    if action == 'unchanged':
+        message = '{} is already up to date'.format(output)
+    elif action == 'appended':
+        message = 'Appended {:,} new storms to {}'.format(lines, output)
+    else:
+        message = 'Wrote all {:,} storms to {}'.format(lines, output)
+    print(message, file=sys.stderr)
+
+# The number of lines, a checksum of the lines and the type of each event in a
+# locations file. The checksum of an event is the sum of the CRCs of its lines,
+# so it doesn't depend on the order that they are in.
+class EventChecksums:
+    # known_events are the events that are already in the output, from the
+    # manifest.
+    def __init__(self, known_events={}):
+        self.events = {}
+        self.known_events = known_events
+        self.new_lines = 0
+
+    # Add every line of a locations file that has an event ID to the checksums
+    # and yield the lines of the events that aren't known yet.
+    def filter_new(self, lines):
+        events = self.events
+        known_events = self.known_events
+        crc32 = zlib.crc32
+        for line in lines:
+            fields = line.split(',', 3)
+            if len(fields) < 4 or not fields[2].isdigit():
+                continue
+            event_id = fields[2]
+            event = events.get(event_id)
+            if event is None:
+                event = events[event_id] = [0, 0]
+            event[0] += 1
+            event[1] = (event[1] + crc32(line.encode())) & 0xffffffff
+
+            if event_id not in known_events:
+                self.new_lines += 1
+                yield line
+
+    # Check that every event that was known still has the same lines, so that
+    # the only changes were new events.
+    def only_added(self):
+        return all(self.events.get(event_id) == known[:2]
+                for event_id, known in self.known_events.items())
+
+    # Add the type of each event, which is looked up in the index for the
+    # events that weren't known.
+    def add_types(self, event_index):
+        for event_id, event in self.events.items():
+            known = self.known_events.get(event_id)
+            if known is None:
+                event.append(find_event_type(event_index, event_id))
+            else:
+                event.append(known[2])
+
+# Check whether any of the events in a manifest have a different type in the
+# details file now, or have been taken out of it, by reading through the index.
+def types_changed(known_events, event_index):
+    found = 0
+    for event_id, event_type in iter_event_types(event_index):
+        known = known_events.get(str(event_id))
+        if known is not None:
+            if known[2] != event_type:
+                return True
+            found += 1
+    return found != sum(known[2] is not None for known in known_events.values())
+
+# The size and modification time of each file, which change whenever NOAA
+# publishes a new version of it.
+def file_stamps(files):
+    stamps = []
+    for name in files:
+        file_stat = os.stat(name)
+        stamps.append([file_stat.st_size, file_stat.st_mtime_ns])
+    return stamps
+
+# Read the manifest of an output file. None is returned if there isn't one, or
+# if the output isn't the size that it was when the manifest was written.
+def read_manifest(output):
+    try:
+        with open(output + MANIFEST_SUFFIX) as manifest_file:
+            manifest = json.load(manifest_file)
+        if (manifest.get('version') != MANIFEST_VERSION or
+                manifest.get('output_size') != os.path.getsize(output)):
+            return None
+    except (OSError, ValueError):
+        return None
+    return manifest
+
+# Write the manifest of an output file in a temporary file and move it into
+# place, so that a half written manifest is never read.
+def write_manifest(output, stamps, footer_offset, events):
+    manifest_file = output + MANIFEST_SUFFIX
+    temporary_file = '{}.{}.tmp'.format(manifest_file, os.getpid())
+    # json.dumps is much faster than json.dump, which encodes the manifest a
+    # piece at a time.
+    with open(temporary_file, 'w') as manifest:
+        manifest.write(json.dumps({'version': MANIFEST_VERSION,
+                                   'inputs': stamps,
+                                   'output_size': os.path.getsize(output),
+                                   'footer_offset': footer_offset,
+                                   'events': events}, separators=(',', ':')))
+    os.replace(temporary_file, manifest_file)
+
+# Remove the manifest of an output file, if it has one.
+def remove_manifest(output):
+    try:
+        os.remove(output + MANIFEST_SUFFIX)
+    except FileNotFoundError:
+        pass
@@ -8,61 +8,250 @@
 #                                                                    #
 ######################################################################
 
+import collections
 import os.path
+import struct
 import sys
 
+from noaa_index import open_event_index, find_event_type
+from noaa_manifest import update_output, print_update, remove_manifest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'kmlutils'))
+from compressed import open_input
+from kmlwriter import FooterError
+from options import parse_options
+from stats import Stats, STATS_OPTIONS, STATS_USAGE
+
+# Output is buffered in blocks of this many bytes.
+BUFFER_SIZE = 1024 * 1024
+
+# The fields of a storm in a .npy output file, as a NumPy structured array
+# description, and their packed layout.
+STORM_DESCR = [('event_id', '<i8'), ('latitude', '<f8'), ('longitude', '<f8'),
+        ('event_type', '<i4')]
+STORM = struct.Struct('<qddi')
+
+# The .npy header is always this long, so that the number of storms can be
+# filled in once they have all been written.
+NPY_HEADER_SIZE = 256
+
 def main():
-    if len(sys.argv) != 4:
+    # The -u option updates the output from a previous run instead of writing
+    # it again.
+    try:
+        options, file_args = parse_options(sys.argv[1:],
+                dict({'-u': False}, **STATS_OPTIONS), {'--update': '-u'})
+    except ValueError:
+        print_usage()
+    if len(file_args) != 3:
         print_usage()
+    locations_file, details_file, output = file_args
+    update = options['-u']
 
     # Check if the output file already exists
-    if os.path.exists(sys.argv[3]):
-        user_response = input(sys.argv[3] +
-                ' already exists. Overwrite it? [y/N] ')
+    if os.path.exists(output) and not update:
+        user_response = input(output + ' already exists. Overwrite it? [y/N] ')
         if user_response == '' or user_response[0] != 'y':
             exit()
 
-    body = ''
+    with Stats(options, [locations_file, details_file], [output]) as stats:
+        # Open the index of event types in the details file so that each
+        # location can be looked up without rescanning the file.
+        with stats.stage('details index'):
+            event_index = open_event_index(details_file)
+
+        skipped = collections.Counter()
+        with stats.stage('convert'):
+            if update:
+                print_update(output, *update_locations(locations_file,
+                    details_file, event_index, output, stats, skipped))
+            else:
+                remove_manifest(output)
+                refine_locations(locations_file, event_index, output, stats,
+                        skipped)
+    print_skipped(skipped, details_file)
+
+# Parse the locations file and write the new document as we go.
+def refine_locations(locations_file, event_index, output, stats, skipped):
+    with open_input(locations_file, 'r') as locations:
+        write_storms(iter_storms(stats.count_rows(locations), event_index,
+            skipped), output)
+
+# Bring an output file that was written by an earlier run up to date, by only
+# adding the storms that are new since then. See update_output.
+def update_locations(locations_file, details_file, event_index, output, stats,
+        skipped):
+    def write_lines(lines):
+        return write_storms(iter_storms(stats.count_rows(lines), event_index,
+            skipped), output)
+
+    def append_lines(lines, footer_offset):
+        return write_storms(iter_storms(stats.count_rows(lines), event_index,
+            skipped), output, footer_offset)
+
+    return update_output(output, locations_file, details_file, event_index,
+            write_lines, append_lines)
+
+# Write storms to a new output file, or add them to the end of one that was
+# already written if footer_offset, the offset of its end, is given. Returns the
+# offset of the end of the output.
+def write_storms(storms, output, footer_offset=None):
+    if output.lower().endswith('.npy'):
+        output_file = StormArrayWriter(output, footer_offset)
+    else:
+        output_file = StormTextWriter(output, footer_offset)
+
+    with output_file:
+        for storm in storms:
+            output_file.write(*storm)
+    return os.path.getsize(output)
+
+# Yield the (event ID, latitude, longitude, event type number) of each line of a
+# NOAA locations file. Locations whose event isn't in the details file or whose
+# coordinates aren't numbers are left out, and counted in skipped if it is
+# given, so that every kind of output gets the same storms.
+def iter_storms(locations, event_index, skipped=None):
+    for line in locations:
+        line_fields = line.split(',')
+
+        # Skip the line if it doesn't start with a number (this is for
+        # skipping the header line)
+        if not line_fields[0].isdigit():
+            continue
+
+        eventID = line_fields[2]
+        latitude = line_fields[7]
+        longitude = line_fields[8]
+        try:
+            float(latitude)
+            float(longitude)
+        except ValueError:
+            if skipped is not None:
+                skipped['bad coordinates'] += 1
+            continue
+
+        this_event_type = find_event_type(event_index, line_fields[2])
+        if this_event_type is None:
+            if skipped is not None:
+                skipped['no event'] += 1
+            continue
+        event_type_number = -1
+        
+        for i, possible_event_type in enumerate(event_types):
+            if this_event_type.upper() == possible_event_type:
+                event_type_number = i
+
+        yield eventID, latitude, longitude, event_type_number
+
+# Write storms as lines of tab separated text. If footer_offset is given, they
+# are added to the file that is already there instead, after cutting it off at
+# footer_offset. If the writer is left because of an exception, a new file is
+# deleted and a file that was being added to is cut back to footer_offset, so
+# that it is left the way it was.
+class StormTextWriter:
     section = 3 * '{}\t' + '{}\n'
 
-    # Parse the input files and build the string containing the body of the new
-    # document as we go.
-    with open(sys.argv[1]) as locations:
-        for line in locations:
-            line_fields = line.split(',')
-
-            # Skip the line if it doesn't start with a number (this is for
-            # skipping the header line)
-            if not line_fields[0].isdigit():
-                continue
-
-            eventID = line_fields[2]
-            latitude = line_fields[7]
-            longitude = line_fields[8]
-            this_event_type = find_event_type(line_fields[2])
-            event_type_number = -1
-            
-            for i, possible_event_type in enumerate(event_types):
-                if this_event_type.upper() == possible_event_type:
-                    event_type_number = i
-
-            body += section.format(eventID, latitude, longitude,
-                    event_type_number)
-
-    # Write the result to a file.
-    with open(sys.argv[3], 'w') as output_file:
-        output_file.write(body)
-
-def find_event_type(event_id):
-    with open(sys.argv[2]) as details:
-        for line in details:
-            if event_id in line:
-                return line.split(',')[12].strip('"')
+    def __init__(self, output_file, footer_offset=None):
+        self.output_name = output_file
+        self.footer_offset = footer_offset
+        if footer_offset is None:
+            self.output_file = open(output_file, 'w', buffering=BUFFER_SIZE)
+        else:
+            os.truncate(output_file, footer_offset)
+            self.output_file = open(output_file, 'a', buffering=BUFFER_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        if self.output_file.closed:
+            return
+        self.output_file.close()
+        if self.footer_offset is None:
+            os.remove(self.output_name)
+        else:
+            os.truncate(self.output_name, self.footer_offset)
+
+    def write(self, eventID, latitude, longitude, event_type_number):
+        self.output_file.write(self.section.format(eventID, latitude,
+            longitude, event_type_number))
+
+    def close(self):
+        self.output_file.close()
+
+# Write storms as a NumPy structured array in a .npy file, which can be memory
+# mapped with numpy.load instead of being parsed. The array is written one
+# storm at a time, and the header, which holds the number of storms, is
+# written again at the end. When storms are added to an array, its header
+# keeps the old number of storms until then.
+class StormArrayWriter(StormTextWriter):
+    def __init__(self, output_file, footer_offset=None):
+        self.output_name = output_file
+        self.footer_offset = footer_offset
+        if footer_offset is None:
+            self.output_file = open(output_file, 'wb', buffering=BUFFER_SIZE)
+            self.count = 0
+            self.output_file.write(npy_header(0))
+            return
+
+        # The array is added to after the storms that are already in it.
+        self.count, extra = divmod(footer_offset - NPY_HEADER_SIZE, STORM.size)
+        if self.count < 0 or extra:
+            raise FooterError('{} is not an array of storms'.format(
+                output_file))
+        self.output_file = open(output_file, 'r+b', buffering=BUFFER_SIZE)
+        self.output_file.seek(footer_offset)
+        self.output_file.truncate()
+
+    def write(self, eventID, latitude, longitude, event_type_number):
+        self.output_file.write(STORM.pack(int(eventID), float(latitude),
+            float(longitude), event_type_number))
+        self.count += 1
+
+    def close(self):
+        if self.output_file.closed:
+            return
+        self.output_file.seek(0)
+        self.output_file.write(npy_header(self.count))
+        self.output_file.close()
+
+# Say on stderr how many locations were left out by iter_storms.
+def print_skipped(skipped, details_file):
+    if skipped['no event']:
+        print('Skipped {:,} storms whose event is not in {}'.format(
+            skipped['no event'], details_file), file=sys.stderr)
+    if skipped['bad coordinates']:
+        print('Skipped {:,} storms whose coordinates are not numbers'.format(
+            skipped['bad coordinates']), file=sys.stderr)
+
+# The header of a version 1.0 .npy file holding count storms.
+def npy_header(count):
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+            STORM_DESCR, count)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + \
+            header.encode('latin1')
 
 def print_usage():
     print((
-            'Usage: {} LOCATIONS_FILE DETAILS_FILE OUTPUT'
-            ).format(sys.argv[0]), file=sys.stderr)
+            'Usage: {} [-u] [--stats] [--profile=FILE] LOCATIONS_FILE '
+            'DETAILS_FILE OUTPUT\n'
+            'If OUTPUT ends in .npy, it is written as a NumPy array instead '
+            'of text\n'
+            'With -u, an OUTPUT from an earlier run with -u is brought up to '
+            'date by only\nadding the storms that are new, unless some of '
+            'the old ones have changed.\n'
+            'Input files ending in .gz, .bz2 or .xz are decompressed as they '
+            'are read.\n'
+            '{}'
+            ).format(sys.argv[0], STATS_USAGE), file=sys.stderr)
     exit()
 
 event_types = ['ASTRONOMICAL LOW TIDE', 'AVALANCHE', 'BLIZZARD',